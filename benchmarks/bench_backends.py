@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Compare the throughput of the subtractor backends on synthetic frames.
+
+    python benchmarks/bench_backends.py --frames 200 --size 1024 768
+
+Threads usually win for small and medium frames, where process start-up and
+pickling results dominate; processes catch up when per-pair compute is large.
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from imagesubtractor.process import (
+    Imagestack,
+    ParallelSubtractor,
+    PoolSubtractor,
+    PreviewPolicy,
+    RoiCollection,
+    ThreadSubtractor,
+)
+
+
+def make_frames(folder: Path, frames: int, width: int, height: int):
+    rng = np.random.default_rng(0)
+    background = rng.integers(90, 160, (height, width, 3), dtype=np.uint8)
+    for i in range(frames):
+        img = background.copy()
+        for k in range(48):
+            x = (k % 8) * width // 8 + (i * 3 + k) % (width // 16)
+            y = (k // 8) * height // 6 + height // 24
+            cv2.circle(img, (x, y), 6, (20, 20, 20), -1)
+        cv2.imwrite(os.fspath(folder / f"{i:06}.jpg"), img)
+
+
+def run_backend(name: str, ims: Imagestack, roicol: RoiCollection, workers: int):
+    last = len(ims) - 1
+    if name == "multi":
+        processnum, tasks = ims.create_task_queue(0, last, 1)
+        sub = ParallelSubtractor(workers).setup_workers
+    else:
+        processnum, tasks = ims.create_list_tasks(0, last, 1)
+        backend = PoolSubtractor if name == "pool" else ThreadSubtractor
+        sub = backend(workers).setup_pool
+    subtractors = sub(
+        processnum=processnum,
+        tasks=tasks,
+        roicollection=roicol.copy(),
+        threshold=2.0,
+        normalized=False,
+        preview=PreviewPolicy.areas_only(),
+    )
+    t1 = time.perf_counter()
+    subtractors.start()
+    count = 0
+    while subtractors.retrieve().num is not None:
+        count += 1
+    elapse = time.perf_counter() - t1
+    subtractors.kill_workers()
+    return count, elapse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--size", type=int, nargs=2, default=(1024, 768))
+    parser.add_argument("--workers", type=int, default=min(os.cpu_count() - 1, 3))
+    parser.add_argument("--backends", nargs="+", default=["multi", "pool", "thread"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp)
+        make_frames(folder, args.frames, *args.size)
+        ims = Imagestack().set_folder(folder)
+        roicol = RoiCollection().set_rois(
+            8, 6, args.size[0] // 8, args.size[1] // 6, 0, 0, 60, 60, 0
+        )
+        width, height = args.size
+        print(f"{len(ims)} frames {width}x{height}, workers: {args.workers}")
+        for name in args.backends:
+            count, elapse = run_backend(name, ims, roicol, args.workers)
+            print(f"{name:>7}: {count / elapse:8.1f} pairs/s ({elapse:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Measure the import time of the package with `python -X importtime`.
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --top 15 --budget 150
+
+Each module is imported in a fresh interpreter, the best of `--repeat` runs
+is reported with the slowest modules it pulled in. With `--budget` (ms) the
+exit code is 1 when a module takes longer, e.g. to keep cv2 or PySide2 out
+of `imagesubtractor.process` in CI.
+"""
+import argparse
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+MODULES = [
+    "imagesubtractor",
+    "imagesubtractor.process",
+    "imagesubtractor.batch",
+    "imagesubtractor.mainwindow",
+]
+
+
+def importtime(module: str) -> Tuple[float, Dict[str, float]]:
+    """total time (ms) and the cumulative time (ms) of every imported module"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    cumulative: Dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cum, name = line[len("import time:") :].split("|")
+        cumulative[name.strip()] = int(cum) / 1000
+    return cumulative[module], cumulative
+
+
+def slowest(cumulative: Dict[str, float], module: str, top: int) -> List[str]:
+    # top level packages only, their submodules are included in them
+    heads = {
+        name: ms
+        for name, ms in cumulative.items()
+        if "." not in name and name != module.split(".")[0]
+    }
+    return sorted(heads, key=heads.get, reverse=True)[:top]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=None, help="ms per module")
+    args = parser.parse_args()
+
+    over = False
+    for module in args.modules:
+        try:
+            runs = [importtime(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{module:>28}: [ERROR] {e}")
+            over = True
+            continue
+        total, cumulative = min(runs, key=lambda run: run[0])
+        heavy = ", ".join(
+            f"{name} {cumulative[name]:.0f}"
+            for name in slowest(cumulative, module, args.top)
+        )
+        print(f"{module:>28}: {total:8.1f} ms  ({heavy})")
+        if args.budget is not None and total > args.budget:
+            over = True
+    return 1 if over else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,4 +3,9 @@
 __version__ = "3.2.0"
 
 
-from .app import run_app
+def run_app(argv=None):
+    # PySide2 is imported only when the GUI is started, so the processing
+    # package stays usable on headless machines.
+    from .app import run_app
+
+    return run_app(argv)
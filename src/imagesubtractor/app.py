@@ -14,16 +14,21 @@ if platform.system() == "Darwin":
     os.environ["QT_MAC_WANTS_LAYER"] = "1"
 
 from imagesubtractor.mainwindow import MainWindow
+from imagesubtractor.process import WarmPool
 
 
 def run_app(argv=None):
     if argv is None:
         argv = sys.argv[1:]
     app = QApplication(argv)
-    appUI = MainWindow()
-    appUI.show()
-    appUI.raise_()
-    ret = app.exec_()
+    warm_pool = WarmPool()
+    try:
+        appUI = MainWindow(warm_pool=warm_pool)
+        appUI.show()
+        appUI.raise_()
+        ret = app.exec_()
+    finally:
+        warm_pool.shutdown()
     multiprocessing.Event().clear()
     sys.exit(ret)
 
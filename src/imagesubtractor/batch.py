@@ -0,0 +1,446 @@
+"""Headless batch processing without Qt.
+
+    imagesubtractor-batch FOLDER [FOLDER ...] [--roi Roi.json] [--threshold 2]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Container, List, Optional, Sequence, Union
+
+from tqdm import tqdm
+
+from .process import (
+    AREA_FORMATS,
+    AreaCsvWriter,
+    BatchJob,
+    BatchScheduler,
+    Imagestack,
+    ParallelSubtractor,
+    PoolSubtractor,
+    CachedRun,
+    PreviewPolicy,
+    ResultCache,
+    RoiCollection,
+    SaveOptions,
+    Subtractor,
+    ThreadSubtractor,
+    WorkerConfig,
+    area_metadata,
+    calibrate_workers,
+    find_resume,
+    is_roi_json,
+    resolve_chunksize,
+    run_params,
+)
+from .utils import timer
+
+
+def find_roi_json(folder: Path) -> Optional[Path]:
+    """Roi.json saved by the GUI, else the last json file like the GUI does"""
+    roijson = folder.joinpath("Roi.json")
+    if roijson.is_file():
+        return roijson
+    jsonfiles = (f for f in folder.glob("*.json") if is_roi_json(f.name))
+    return max(jsonfiles, key=lambda f: f.name, default=None)
+
+
+def parse_auto(value: str) -> Union[int, str]:
+    return value if value.lower() == "auto" else int(value)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="imagesubtractor-batch",
+        description="Measure the subtracted areas of image folders without a GUI.",
+    )
+    parser.add_argument("folders", nargs="+", type=Path, help="image folders")
+    parser.add_argument(
+        "--roi",
+        type=Path,
+        default=None,
+        help="Roi.json to use for every folder (default: the one in each folder)",
+    )
+    parser.add_argument("--threshold", type=float, default=2.0)
+    parser.add_argument("--normalized", action="store_true")
+    parser.add_argument("--step", type=int, default=1)
+    parser.add_argument("--start", type=int, default=0)
+    parser.add_argument("--end", type=int, default=-1, help="last frame (inclusive)")
+    parser.add_argument(
+        "--backend", choices=("multi", "pool", "thread"), default="pool"
+    )
+    parser.add_argument(
+        "--workers", type=parse_auto, default=None, help="number of workers or auto"
+    )
+    parser.add_argument("--cv-threads", type=int, default=1)
+    parser.add_argument("--affinity", action="store_true")
+    parser.add_argument(
+        "--chunksize", type=parse_auto, default=None, help="pairs per task or auto"
+    )
+    parser.add_argument("--save", action="store_true", help="save blurred images")
+    parser.add_argument(
+        "--save-format",
+        choices=("tif", "png", "jpg", "stack", "mask"),
+        default="tif",
+        help="one image per pair, one FrameStore container (stack) or a packed "
+        "archive of the binary masks for imagesubtractor-remeasure (mask)",
+    )
+    parser.add_argument(
+        "--save-stack", choices=("subtract", "blur", "binary"), default="blur"
+    )
+    parser.add_argument(
+        "--save-dir",
+        type=Path,
+        default=None,
+        help="folder of the saved frames (default: <folder>_derived)",
+    )
+    parser.add_argument(
+        "--save-compression",
+        type=int,
+        default=None,
+        help="png level, tiff compression code or jpeg quality",
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="start over instead of resuming an interrupted Area.csv",
+    )
+    parser.add_argument(
+        "--format",
+        nargs="+",
+        choices=AREA_FORMATS,
+        default=["csv"],
+        dest="formats",
+        help="Area.csv is always written, binary formats are written next to it",
+    )
+    parser.add_argument(
+        "--priority",
+        choices=("fifo", "size", "largest", "deadline"),
+        default="fifo",
+        help="order of the folders sharing the pool (pool backend)",
+    )
+    parser.add_argument(
+        "--deadline",
+        nargs="+",
+        type=float,
+        default=[],
+        help="seconds after the start for each folder, in order, for "
+        "--priority deadline (folders without one go last)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="measure every pair instead of reusing the areas of earlier runs",
+    )
+    parser.add_argument(
+        "--cache-dir", type=Path, default=None, help="default: ~/.cache/imagesubtractor"
+    )
+    return parser
+
+
+def create_subtractors(
+    args: argparse.Namespace,
+    ims: Imagestack,
+    roicol: RoiCollection,
+    start: int,
+    end: int,
+    skip: int = 0,
+    cached: Container[int] = (),
+):
+    subtractor = Subtractor(args.threshold, args.normalized)
+    workers = args.workers
+    if workers == "auto" and args.backend != "thread":
+        _, sample = ims.create_list_tasks(
+            start, min(start + 32 * args.step, end), args.step
+        )
+        config = calibrate_workers(sample, roicol, subtractor, affinity=args.affinity)
+    else:
+        config = WorkerConfig(
+            workers if isinstance(workers, int) else WorkerConfig().num_workers,
+            args.cv_threads,
+            args.affinity,
+        )
+
+    if args.backend == "multi":
+        subtractors = ParallelSubtractor(*config)
+        create_task, create_chunk = ims.create_task_queue, ims.create_chunk_queue
+        setup = subtractors.setup_workers
+    else:
+        if args.backend == "pool":
+            subtractors = PoolSubtractor(
+                config.num_workers,
+                cv_threads=config.cv_threads,
+                affinity=config.affinity,
+            )
+        else:
+            num_threads = workers if isinstance(workers, int) else None
+            subtractors = ThreadSubtractor(num_threads)
+        create_task, create_chunk = ims.create_list_tasks, ims.create_chunk_tasks
+        setup = subtractors.setup_pool
+
+    if args.chunksize is not None:
+        chunksize = resolve_chunksize(
+            args.chunksize,
+            ims,
+            start,
+            end,
+            args.step,
+            roicol,
+            subtractor,
+            subtractors.num_workers,
+        )
+        processnum, tasks = create_chunk(
+            start, end, args.step, chunksize, skip, cached
+        )
+    else:
+        processnum, tasks = create_task(start, end, args.step, skip, cached)
+
+    return setup(
+        processnum=processnum,
+        tasks=tasks,
+        roicollection=roicol,
+        threshold=args.threshold,
+        normalized=args.normalized,
+        saveflag=save_options(args),
+        preview=PreviewPolicy.areas_only(),
+    )
+
+
+def save_options(args: argparse.Namespace):
+    if not args.save:
+        return False
+    return SaveOptions(
+        args.save_format,
+        args.save_compression,
+        stack=args.save_stack,
+        outputdir=None if args.save_dir is None else str(args.save_dir),
+    )
+
+
+def open_cache(
+    args: argparse.Namespace, ims: Imagestack, roicol: RoiCollection, end: int
+) -> Optional[CachedRun]:
+    # saved frames need every pair to be computed
+    if args.no_cache or args.save:
+        return None
+    cached = ResultCache(args.cache_dir).open(
+        ims,
+        roicol,
+        Subtractor(args.threshold, args.normalized),
+        args.start,
+        end,
+        args.step,
+    )
+    if cached.hits:
+        print(f"[SYSTEM] {len(cached.hits)} pairs of {ims.homedir} found in the cache")
+    return cached
+
+
+def check_resume(
+    args: argparse.Namespace,
+    ims: Imagestack,
+    roicol: RoiCollection,
+    end: int,
+    outputfile: Path,
+):
+    """run parameters and the checkpoint of an interrupted run, if any"""
+    params = run_params(
+        ims, roicol, args.threshold, args.normalized, args.start, end, args.step
+    )
+    resume = None if args.no_resume else find_resume(outputfile, params)
+    if resume:
+        print(f"[SYSTEM] Resuming {outputfile} after {resume['rows']} pairs")
+    return params, resume
+
+
+def collect_areas(
+    subtractors,
+    writer: AreaCsvWriter,
+    desc: str = "",
+    initial: int = 0,
+    cached: Optional[CachedRun] = None,
+) -> int:
+    count = 0
+    subtractors.start()
+    try:
+        with writer, tqdm(
+            desc=desc, total=subtractors.processnum, initial=initial
+        ) as tbar:
+            if cached is not None:
+                for i, areadata in sorted(cached.hits.items()):
+                    if i >= initial:
+                        writer.write(i, areadata)
+                        tbar.update()
+            while True:
+                i, _, areadata = subtractors.retrieve()
+                if i is None:
+                    break
+                writer.write(i, areadata)
+                if cached is not None:
+                    cached.put(i, areadata)
+                tbar.update()
+                count += 1
+    finally:
+        subtractors.kill_workers()
+        if cached is not None:
+            cached.close()
+    return count
+
+
+def load_folder(args: argparse.Namespace, folder: Path):
+    ims = Imagestack().set_folder(folder)
+    if len(ims) < 2:
+        print(f"[ERROR] {folder} has less than two images")
+        return None, None
+    roijson = args.roi or find_roi_json(folder)
+    if roijson is None:
+        print(f"[ERROR] No roi json file for {folder}")
+        return None, None
+    return ims, RoiCollection.from_json(roijson)
+
+
+def process_folder(args: argparse.Namespace, folder: Path) -> Optional[int]:
+    """pairs computed, 0 when all were resumed or cached, None on failure"""
+    ims, roicol = load_folder(args, folder)
+    if ims is None:
+        return None
+
+    last = len(ims) - 1
+    end = last if args.end < 0 else min(args.end, last)
+    outputfile = folder.joinpath("Area.csv")
+    params, resume = check_resume(args, ims, roicol, end, outputfile)
+    skip = resume["rows"] if resume else 0
+    cached = open_cache(args, ims, roicol, end)
+    subtractors = create_subtractors(
+        args, ims, roicol, args.start, end, skip, cached.hits if cached else ()
+    )
+
+    writer = AreaCsvWriter(
+        outputfile,
+        subtractors.roinum,
+        subtractors.processnum,
+        params=params,
+        resume=resume,
+        formats=args.formats,
+        meta=area_metadata(ims, roicol, args.start, end, args.step),
+    )
+    t1 = time.perf_counter()
+    count = collect_areas(
+        subtractors, writer, desc=f"[{folder}]", initial=skip, cached=cached
+    )
+    elapse = time.perf_counter() - t1
+    print(
+        f"[SYSTEM] Area.csv was saved at {folder} "
+        f"({count / max(elapse, 1e-9):.1f} pairs/s)"
+    )
+    return count
+
+
+def prepare_job(
+    args: argparse.Namespace, folder: Path, deadline: Optional[float] = None
+) -> Optional[BatchJob]:
+    ims, roicol = load_folder(args, folder)
+    if ims is None:
+        return None
+    last = len(ims) - 1
+    end = last if args.end < 0 else min(args.end, last)
+    params, resume = check_resume(args, ims, roicol, end, folder.joinpath("Area.csv"))
+    job = BatchJob(
+        folder,
+        roicol,
+        args.threshold,
+        args.normalized,
+        start=args.start,
+        end=end,
+        step=args.step,
+        saveflag=save_options(args),
+        deadline=deadline,
+        params=params,
+        resume=resume,
+        formats=args.formats,
+        cached=open_cache(args, ims, roicol, end),
+    )
+    job.imagestack = ims
+    return job.prepare()
+
+
+def run_scheduled(args: argparse.Namespace, failed: List[Path]) -> int:
+    """process every folder on one shared pool"""
+    jobs: List[BatchJob] = []
+    deadlines = args.deadline + [None] * (len(args.folders) - len(args.deadline))
+    for folder, deadline in zip(args.folders, deadlines):
+        # a bad folder is reported like in process_folder, the others still run
+        try:
+            job = prepare_job(args, folder.resolve(), deadline)
+        except Exception as e:
+            print(f"[ERROR] {folder}: {e}")
+            job = None
+        if job is None:
+            failed.append(folder)
+            continue
+        jobs.append(job)
+    if not jobs:
+        return 0
+
+    first = jobs[0]
+    subtractor = Subtractor(args.threshold, args.normalized)
+    if args.workers == "auto":
+        config = calibrate_workers(
+            first.tasks[:32], first.roicollection, subtractor, affinity=args.affinity
+        )
+    else:
+        config = WorkerConfig(
+            args.workers or WorkerConfig().num_workers, args.cv_threads, args.affinity
+        )
+    if args.chunksize is not None:
+        chunksize = resolve_chunksize(
+            args.chunksize,
+            first.imagestack,
+            args.start,
+            args.start + first.processnum * args.step,
+            args.step,
+            first.roicollection,
+            subtractor,
+            config.num_workers,
+        )
+        for job in jobs:
+            job.chunksize = chunksize
+            job.prepare()
+
+    scheduler = BatchScheduler(jobs, config, priority=args.priority)
+    scheduler.start()
+    scheduler.join()
+    for job in jobs:
+        if job.error is not None:
+            failed.append(job.folder)
+    return sum(job.computed for job in jobs if job.error is None)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    total = 0
+    failed: List[Path] = []
+    t1 = time.perf_counter()
+    with timer():
+        if args.backend == "pool":
+            total = run_scheduled(args, failed)
+        else:
+            for folder in args.folders:
+                try:
+                    done = process_folder(args, folder.resolve())
+                except Exception as e:
+                    print(f"[ERROR] {folder}: {e}")
+                    done = None
+                if done is None:
+                    failed.append(folder)
+                    continue
+                total += done
+    elapse = time.perf_counter() - t1
+    print(f"[SYSTEM] {total} pairs, {total / max(elapse, 1e-9):.1f} pairs/s")
+    if failed:
+        print(f"[ERROR] Failed folders: {', '.join(map(str, failed))}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
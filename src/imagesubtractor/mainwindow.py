@@ -1,5 +1,7 @@
+import copy
+import functools
 from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, Container, Dict, Optional, Tuple, Union
 
 import cv2
 import numpy as np
@@ -16,15 +18,27 @@ from PySide2.QtWidgets import (
 from .icon import ICON_DATA
 from .mainwindowUI import MainWindowUI
 from .process import (
+    ActivityBuffer,
     Contrast,
     ImageProcessQWorker,
     Imagestack,
     ParallelSubtractor,
     PoolSubtractor,
+    PreviewPolicy,
+    ResultCache,
+    ResumeError,
     RoiCollection,
     Subtractor,
+    ThreadSubtractor,
+    WarmPool,
+    WorkerConfig,
+    calibrate_workers,
+    find_resume,
+    resolve_chunksize,
+    run_params,
 )
 from .utils import dump_json
+from .widgets import FolderListing, FolderLoader, PreviewRenderer, PreviewRequest
 
 
 class MainWindow(QMainWindow, MainWindowUI):
@@ -37,6 +51,22 @@ class MainWindow(QMainWindow, MainWindowUI):
         self.roijsonfile = None
         self.roicol = None
         self.cr = Contrast()
+        # lists the folder being opened, see setup_imagestack
+        self.loader: Optional[FolderLoader] = None
+        # the preview is rendered on its own thread, see draw_view
+        self.renderer = PreviewRenderer(self)
+        self.renderer.rendered.connect(self.show_preview)
+        self.renderer.start()
+        # refresh rate of the live view while processing
+        self.display_fps = 20.0
+        # bursts of spinbox changes are coalesced into one update once the
+        # input settles: the roi grid is cheap to redraw, the subtraction is not
+        self.roi_timer = self.single_shot_timer(40, self.setroi)
+        self.render_timer = self.single_shot_timer(150, self.draw_view)
+        # worker processes kept alive between runs, owned by the application
+        self.warm_pool: Optional[WarmPool] = kwargs.get("warm_pool")
+        # areas of the pairs already measured with the same rois and threshold
+        self.result_cache = ResultCache()
         self.setup_widget_events()
 
     def setup_widget_events(self):
@@ -53,8 +83,13 @@ class MainWindow(QMainWindow, MainWindowUI):
 
         for obj in self.findChild(QWidget).children():
             objname = obj.objectName()
-            if "doubleSpinBox" in objname or "spinBox" in objname:
-                obj.valueChanged.connect(self.setroi)
+            if objname in ("doubleSpinBox_threshold", "spinBox_step"):
+                # changes the pixels of the preview, not the rois
+                obj.valueChanged.connect(self.restart_render_timer)
+            elif objname in ("spinBox_start", "spinBox_end"):
+                continue
+            elif "doubleSpinBox" in objname or "spinBox" in objname:
+                obj.valueChanged.connect(self.restart_roi_timer)
 
         # set open and roi buttons
         self.pushButton_open.clicked.connect(self.askdirectory)
@@ -86,9 +121,25 @@ class MainWindow(QMainWindow, MainWindowUI):
         self.checkBox_lock.toggled.connect(self.contrast_view.setDisabled)
         self.checkBox_json.toggled.connect(self.setroi)
         self.checkBox_prenormalized.toggled.connect(self.showNormState)
+        self.checkBox_prenormalized.toggled.connect(self.restart_render_timer)
 
         QtCore.QMetaObject.connectSlotsByName(self)
 
+    def single_shot_timer(self, msec: int, slot) -> QtCore.QTimer:
+        timer = QtCore.QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(msec)
+        timer.timeout.connect(slot)
+        return timer
+
+    # connected to the spinboxes: QTimer.start would take their value as the
+    # interval, these restart the timer with its own
+    def restart_roi_timer(self, *_):
+        self.roi_timer.start()
+
+    def restart_render_timer(self, *_):
+        self.render_timer.start()
+
     def showNormState(self):
         if self.checkBox_prenormalized.isChecked():
             msg = "[SYSTEM] Images will be normalized before subtraction"
@@ -108,6 +159,10 @@ class MainWindow(QMainWindow, MainWindowUI):
         return self.show_message(msg)
 
     def askdirectory(self) -> "MainWindow":
+        if self.loader is not None:
+            # the open button cancels the folder being loaded
+            self.cancel_loading()
+            return
         default = str(Path.home() / "Desktop")
         dialog = QFileDialog(self, directory=default)
         dirs = dialog.getExistingDirectory()
@@ -117,27 +172,74 @@ class MainWindow(QMainWindow, MainWindowUI):
         self.setup_imagestack(dirs)
 
     def setup_imagestack(self, dirs: Path):
-        jsonfiles = (f for f in Path(dirs).glob("*.json") if not f.name.startswith("."))
-        self.roijsonfile = max(jsonfiles, key=lambda f: f.name, default=None)
+        """list the folder on a FolderLoader.
+
+        The window is set up from the first image, the rest of the listing
+        is added by update_imagestack while it streams in.
+        """
         self.show_message(f"[SYSTEM] The directory is selected at: {str(dirs)}")
-        self.ims = Imagestack().set_folder(dirs)
+        self.ims = None
+        self.roijsonfile = None
+        self.loader = FolderLoader(dirs, self)
+        self.loader.listed.connect(self.update_imagestack)
+        self.loader.failed.connect(self.loading_failed)
+        self.pushButton_open.setText("Cancel")
+        self.progressbar.setRange(0, 0)
+        self.progressbar.show()
+        self.loader.start()
+        return self
 
-        if not len(self.ims):
-            self.ims = None
+    def update_imagestack(self, listing: FolderListing):
+        if self.sender() is not self.loader:
+            # late listing of a cancelled folder
+            return
+        if self.ims is None:
+            self.ims = Imagestack()
+            self.ims.homedir = listing.homedir
+            self.ims.imagelist = listing.imagelist
+            self.ims.img_height, self.ims.img_width = listing.shape
+            # the rois are drawn on the first view
+            self.reset_value_boundary().setroi().setview().setcontrast()
+        else:
+            at_end = self.endslice == len(self.ims) - 1
+            self.ims.imagelist = listing.imagelist
+            self.extend_value_boundary(at_end)
+        self.set_text_num(self.view.value)
+        if not listing.done:
+            self.show_message(f"[SYSTEM] Loading... {len(self.ims)} images")
+            return
+
+        self.finish_loading()
+        self.roijsonfile = listing.roijsonfile
+        if self.roijsonfile is not None:
+            self.setroi()
+        self.draw_view()
+        self.show_message(f"Image numbers: {len(self.ims)}")
+
+    def loading_failed(self, msg: str):
+        if self.sender() is not self.loader:
+            return
+        self.finish_loading()
+        if self.ims is None:
             self.cr = Contrast()
-            self.show_message(
-                "[SYSTEM] The directory does not have any jpg files"
-            ).update()
-            return self
+        self.show_message(msg)
 
-        return (
-            self.reset_value_boundary()
-            .setview()
-            .setcontrast()
-            .setroi()
-            .show_message(f"Image numbers: {len(self.ims)}")
+    def cancel_loading(self):
+        self.loader.cancel()
+        self.finish_loading()
+        if self.ims is None:
+            self.show_message("[SYSTEM] Loading was cancelled")
+            return
+        self.draw_view()
+        self.show_message(
+            f"[SYSTEM] Loading was cancelled, {len(self.ims)} images were listed"
         )
 
+    def finish_loading(self):
+        self.loader = None
+        self.pushButton_open.setText("Open")
+        self.progressbar.hide()
+
     def setcontrast(self) -> "MainWindow":
         def set_contrast_view_callback():
             self.cr.set_range(*self.contrast_view.get_range())
@@ -154,36 +256,53 @@ class MainWindow(QMainWindow, MainWindowUI):
         self.view.slider.setTickInterval(len(self.ims) // 10)
         img = self.ims.read_image(0)
         H, W = img.shape[:2]
-        self.resize(640 + W + 20, max(H + 75, 610))
+        self.resize(640 + W + 20, max(H + 295, 610))
         self.view.setGeometry(QtCore.QRect(640, 20, W, H + 50))
         self.progressbar.setGeometry(QtCore.QRect(650, H + 75, W - 10, 35))
-        self.view.imshow(self.roicol.draw_rois(img), 0)
+        self.activity_view.setGeometry(QtCore.QRect(650, H + 115, W - 10, 180))
+        if self.roicol is not None:
+            img = self.roicol.draw_rois(img)
+        self.view.imshow(img, 0)
         self.checkBox_sub.clicked.connect(self.draw_view)
         self.view.valueChanged.connect(self.draw_view)
         return self
 
     def draw_view(self):
+        """ask the renderer for the preview of the current frame.
+
+        Only the latest request is rendered, and the frame is subtracted
+        again only when the frame or the subtraction parameters changed, a
+        roi change just redraws the rois.
+        """
+        if self.ims is None or self.roicol is None:
+            return
+        self.render_timer.stop()
         self.set_text_num(self.view.value)
-        img = self.ims.read_image(self.view.value)
-        self.contrast_view.imshow(self.cr.draw_histogram(img))
-        if self.cr.adjusted:
-            img = self.cr.draw_contrast(img)
-        if self.show_subtract:
-            binary = np.zeros_like(img, dtype=np.uint8)
-            if self.view.value >= self.slicestep:
-                pre = self.ims.read_image(self.view.value - self.slicestep)
-                _, _, binary = (
-                    Subtractor(self.threshold, self.normalized)
-                    .set_image(pre, 0)
-                    .set_image(img, 1)
-                    .subtract()
-                    .median_blur()
-                    .threshold_binarize()
-                    .get_results()
-                )
-            img = binary.astype(np.uint8) * 255
-        img_roi = self.roicol.draw_rois(img)
-        self.view.imshow(img_roi)
+        self.renderer.submit(
+            PreviewRequest(
+                self.ims,
+                self.view.value,
+                self.slicestep,
+                self.show_subtract,
+                self.threshold,
+                self.normalized,
+                copy.copy(self.cr),
+                self.roicol,
+            )
+        )
+
+    def show_preview(self, result):
+        frame, qimg, hist, _ = result
+        self.contrast_view.imshow(hist)
+        self.view.show_qimage(qimg)
+
+    def closeEvent(self, event):
+        if self.loader is not None:
+            loader = self.loader
+            self.cancel_loading()
+            loader.wait()
+        self.renderer.stop()
+        super().closeEvent(event)
 
     def set_text_num(self, num: int):
         if self.ims is None or not len(self.ims):
@@ -201,11 +320,25 @@ class MainWindow(QMainWindow, MainWindowUI):
         # change spinbox range before set value
         self.spinBox_start.setMaximum(total)
         self.spinBox_end.setMaximum(total)
-        self.spinBox_step.setMaximum(total - 1)
+        # a listing starts with one image, the step stays at 1 or more
+        self.spinBox_step.setRange(1, max(total - 1, 1))
         self.spinBox_start.setValue(0)
         self.spinBox_end.setValue(total)
         return self
 
+    def extend_value_boundary(self, at_end: bool) -> "MainWindow":
+        """follow a growing listing, the end stays at the last image if it
+        was there"""
+        total = len(self.ims) - 1
+        self.view.setMaximum(total)
+        self.view.slider.setTickInterval(len(self.ims) // 10)
+        self.spinBox_start.setMaximum(total)
+        self.spinBox_end.setMaximum(total)
+        self.spinBox_step.setRange(1, max(total - 1, 1))
+        if at_end:
+            self.spinBox_end.setValue(total)
+        return self
+
     def doubleSpinBox_value_update(self, **kwargs):
         x = self.horizontalSlider_x.value()
         y = self.horizontalSlider_y.value()
@@ -292,6 +425,7 @@ class MainWindow(QMainWindow, MainWindowUI):
             roi_kws.update(xmax=xmax, ymax=ymax)
             self.roicol = RoiCollection().set_rois(**roi_kws)
 
+        self.roi_timer.stop()
         self.draw_view()
         return self
 
@@ -313,20 +447,84 @@ class MainWindow(QMainWindow, MainWindowUI):
             self.showError("[SYSTEM] The directory is not selected")
             return
 
-    def setup_process_type(self, proc_type="multi") -> Tuple[int, ParallelSubtractor]:
+    def setup_process_type(
+        self,
+        proc_type="multi",
+        preview: PreviewPolicy = PreviewPolicy(),
+        chunksize: Union[int, str, None] = None,
+        workers: Union[WorkerConfig, str, None] = None,
+        skip: int = 0,
+        cached: Container[int] = (),
+    ) -> Tuple[int, ParallelSubtractor]:
         proc_type = proc_type.lower()
-        if proc_type not in ("multi", "pool"):
+        if proc_type not in ("multi", "pool", "thread"):
             raise TypeError(proc_type)
 
+        if workers is None:
+            workers = WorkerConfig(self.num_workers) if self.num_workers else "auto"
+        warm_pool = self.warm_pool if proc_type == "pool" else None
+        if workers == "auto" and warm_pool is not None and warm_pool.config:
+            # keep the warm pool instead of calibrating again
+            workers = warm_pool.config
+        if workers == "auto" and proc_type != "thread":
+            self.show_message("[SYSTEM] Calibrating the number of workers...")
+            _, sample = self.ims.create_list_tasks(
+                self.startslice,
+                min(self.startslice + 32 * self.slicestep, self.endslice),
+                self.slicestep,
+            )
+            workers = calibrate_workers(
+                sample, self.roicol.copy(), Subtractor(self.threshold, self.normalized)
+            )
+            self.show_message(
+                f"[SYSTEM] Workers: {workers.num_workers}, "
+                f"OpenCV threads: {workers.cv_threads}"
+            )
+        # threads default to one per cpu when the count is left to "auto"
+        thread_workers = workers.num_workers if workers != "auto" else None
+        if not isinstance(workers, WorkerConfig):
+            workers = WorkerConfig()
+
         create_task = self.ims.create_task_queue
-        setup_subtractor = ParallelSubtractor().setup_workers
+        subtractor = ParallelSubtractor(*workers)
+        setup_subtractor = subtractor.setup_workers
 
         # TODO
         if proc_type == "pool":
             create_task = self.ims.create_list_tasks
-            setup_subtractor = PoolSubtractor().setup_pool
+            subtractor = PoolSubtractor(
+                workers.num_workers,
+                cv_threads=workers.cv_threads,
+                affinity=workers.affinity,
+                warm_pool=warm_pool,
+            )
+            setup_subtractor = subtractor.setup_pool
+        elif proc_type == "thread":
+            create_task = self.ims.create_list_tasks
+            subtractor = ThreadSubtractor(thread_workers)
+            setup_subtractor = subtractor.setup_pool
+
+        if chunksize is not None:
+            chunksize = resolve_chunksize(
+                chunksize,
+                self.ims,
+                self.startslice,
+                self.endslice,
+                self.slicestep,
+                self.roicol,
+                Subtractor(self.threshold, self.normalized),
+                subtractor.num_workers,
+            )
+            create_chunk = (
+                self.ims.create_chunk_tasks
+                if proc_type in ("pool", "thread")
+                else self.ims.create_chunk_queue
+            )
+            create_task = functools.partial(create_chunk, chunksize=chunksize)
 
-        processnum, task = create_task(self.startslice, self.endslice, self.slicestep)
+        processnum, task = create_task(
+            self.startslice, self.endslice, self.slicestep, skip=skip, cached=cached
+        )
         self.outputdata = np.zeros((processnum, len(self.roicol)), dtype=int)
 
         subtractors = setup_subtractor(
@@ -336,24 +534,79 @@ class MainWindow(QMainWindow, MainWindowUI):
             threshold=self.threshold,
             normalized=self.normalized,
             saveflag=False,
+            preview=preview,
         )
         return processnum, subtractors
 
     def startprocess(self):
         if not self.ims or not len(self.ims):
             return
+        if self.loader is not None:
+            self.showError("[SYSTEM] The directory is still loading")
+            return
+
+        params = run_params(
+            self.ims,
+            self.roicol,
+            self.threshold,
+            self.normalized,
+            self.startslice,
+            self.endslice,
+            self.slicestep,
+        )
+        try:
+            resume = find_resume(self.ims.homedir / "Area.csv", params)
+        except ResumeError as e:
+            self.showError(f"[ERROR] {e}")
+            return
+        skip = resume["rows"] if resume else 0
+        if skip:
+            self.show_message(f"[SYSTEM] Resuming Area.csv after {skip} pairs")
+        try:
+            cached = self.result_cache.open(
+                self.ims,
+                self.roicol,
+                Subtractor(self.threshold, self.normalized),
+                self.startslice,
+                self.endslice,
+                self.slicestep,
+            )
+        except OSError as e:
+            print(f"[ERROR] The result cache is not available: {e}")
+            cached = None
+        if cached is not None and cached.hits:
+            self.show_message(f"[SYSTEM] {len(cached.hits)} pairs found in the cache")
 
         self.checkBox_lock.setCheckState(QtCore.Qt.CheckState.Checked)
         # processnum, task = self.ims.create_task_queue(
         #     self.startslice, self.endslice, self.slicestep
         # )
-        processnum, subtractors = self.setup_process_type()
+        processnum, subtractors = self.setup_process_type(
+            "pool" if self.warm_pool is not None else "multi",
+            # the workers only ship the images the live view can show
+            preview=PreviewPolicy(every_n=0, every_sec=1.0 / self.display_fps),
+            skip=skip,
+            cached=cached.hits if cached is not None else (),
+        )
         self.__roi_mask = self.roicol.draw_rois(np.zeros_like(self.ims.read_image(0)))
+        self.__small_mask = None
         dump_json(self.ims.homedir / "Roi.json", self.roicol.roidict)
         self.show_message("[SYSTEM] Roi.json was saved at %s" % self.imagedir)
         self.progressbar.setRange(0, processnum)
         self.progressbar.show()
-        qt = ImageProcessQWorker(self, subtractors, self.ims.homedir)
+        activity = ActivityBuffer(len(self.roicol), processnum=processnum)
+        self.activity_view.set_buffer(activity)
+        self.activity_view.show()
+        qt = ImageProcessQWorker(
+            self,
+            subtractors,
+            self.ims.homedir,
+            params=params,
+            resume=resume,
+            cached=cached,
+            fps=self.display_fps,
+            activity=activity,
+        )
         qt.start()
 
         def finish():
@@ -370,9 +623,23 @@ class MainWindow(QMainWindow, MainWindowUI):
             return
         i, image = task
         self.set_text_num(i)
-        image = cv2.addWeighted(image, 1, self.__roi_mask, 1, 0)
-        self.view.imshow(image)
+        if image is not None:
+            # blend at the size of the view, not of the frame
+            h, w = image.shape[:2]
+            width, height = self.view.canvas_size
+            scale = min(width / w, height / h)
+            mask = self.__roi_mask
+            if scale < 1:
+                size = (max(int(w * scale), 1), max(int(h * scale), 1))
+                if self.__small_mask is None or self.__small_mask.shape[1::-1] != size:
+                    self.__small_mask = cv2.resize(
+                        mask, size, interpolation=cv2.INTER_AREA
+                    )
+                image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+                mask = self.__small_mask
+            self.view.imshow(cv2.addWeighted(image, 1, mask, 1, 0))
         self.progressbar.setValue(i)
+        self.activity_view.redraw()
 
     def showsubtmedimg(self, n):
         if self.ip.is_alive():
@@ -21,7 +21,8 @@ from PySide2.QtWidgets import (
     QLineEdit,
 )
 
-from .widgets import ContrastWidget, SliderViewer
+from .process import WorkerConfig
+from .widgets import ActivityPlot, ContrastWidget, SliderViewer
 
 
 def qfont(
@@ -69,6 +70,7 @@ class MainWindowUI:
     __drotate = 0  # roi rotate degree
     __dthreshold = 2  # threshold
     __slicestep = 1  # step to process slice.
+    __dworkers = WorkerConfig().num_workers  # worker processes, 0 is auto
 
     def setupUi(self, MainWindow: QMainWindow):
         MainWindow.setObjectName("MainWindow")
@@ -284,6 +286,10 @@ class MainWindowUI:
         self.progressbar.hide()
         self.progressbar.setObjectName("progressbar")
 
+        self.activity_view = ActivityPlot(self)
+        self.activity_view.hide()
+        self.activity_view.setObjectName("activity_view")
+
         self.contrast_view = ContrastWidget(self)
         self.contrast_view.setGeometry(QtCore.QRect(30, 400, 270, 200))
         self.contrast_view.setObjectName("contrast_view")
@@ -319,6 +325,16 @@ class MainWindowUI:
         self.spinBox_end.setMaximum(100000)
         self.spinBox_end.setObjectName("spinBox_end")
 
+        # number of workers, 0 is calibrated at start. The object name must not
+        # contain "spinBox" to stay out of the roi callbacks.
+        self.workerBox = QSpinBox(self.centralwidget)
+        self.workerBox.setGeometry(QtCore.QRect(195, 245, 55, 25))
+        self.workerBox.setMinimum(0)
+        self.workerBox.setMaximum(1024)
+        self.workerBox.setValue(self.__dworkers)
+        self.workerBox.setSpecialValueText("auto")
+        self.workerBox.setObjectName("workerBox")
+
         label_font = qfont(pointsize=10, bold=True, weight=75)
         self.label_geometries = [
             ("Width:", (190, 10, 43, 25)),
@@ -334,6 +350,7 @@ class MainWindowUI:
             ("Threshold:", (340, 275, 73, 25)),
             ("Start:", (340, 305, 73, 25)),
             ("End:", (340, 335, 73, 25)),
+            ("Workers:", (130, 245, 60, 25)),
         ]
 
         for i, (_, geo) in enumerate(self.label_geometries):
@@ -387,6 +404,11 @@ class MainWindowUI:
     def slicestep(self) -> int:
         return int(self.spinBox_step.value())
 
+    @property
+    def num_workers(self) -> Optional[int]:
+        """None when the worker count should be calibrated"""
+        return int(self.workerBox.value()) or None
+
     @property
     def normalized(self) -> bool:
         return self.checkBox_prenormalized.isChecked()
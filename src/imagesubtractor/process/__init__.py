@@ -1,7 +1,97 @@
-from .contrast import Contrast
-from .imageprocess import Imageprocess
-from .imageprocessqt import ImageProcessQWorker
-from .imagestack import Imagestack
-from .parallel_subtractor import ParallelSubtractor, PoolSubtractor
-from .roicollection import RoiCollection
-from .subtractor import Subtractor
+"""Processing of the image stacks.
+
+The names below are imported from their submodule at first use: cv2, numpy
+and PySide2 are only loaded by the parts that need them, so importing this
+package, or one class from it, stays cheap.
+"""
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .activitybuffer import ActivityBuffer
+    from .areaformats import (
+        AREA_FORMATS,
+        area_metadata,
+        read_area_matrix,
+        read_area_metadata,
+        write_area_matrix,
+    )
+    from .areawriter import AreaCsvWriter, write_area_csv
+    from .batchscheduler import BatchJob, BatchScheduler
+    from .chunking import auto_chunksize, resolve_chunksize
+    from .contrast import Contrast
+    from .imageprocess import Imageprocess
+    from .framestore import FrameStore
+    from .imagestack import Imagestack
+    from .imagewriter import SaveOptions
+    from .parallel_subtractor import (
+        ParallelSubtractor,
+        PoolSubtractor,
+        ThreadSubtractor,
+        WorkerError,
+    )
+    from .maskarchive import MaskArchive
+    from .preview import PreviewPolicy
+    from .resultcache import CachedRun, ResultCache
+    from .resume import ResumeError, find_resume, run_params
+    from .roicollection import RoiCollection, is_roi_json
+    from .sharding import ShardCoordinator, ShardNode
+    from .subtractor import Subtractor
+    from .warmpool import WarmPool
+    from .workerconfig import WorkerConfig, calibrate_workers
+    from .imageprocessqt import ImageProcessQWorker
+
+_EXPORTS = {
+    "ActivityBuffer": "activitybuffer",
+    "AREA_FORMATS": "areaformats",
+    "area_metadata": "areaformats",
+    "read_area_matrix": "areaformats",
+    "read_area_metadata": "areaformats",
+    "write_area_matrix": "areaformats",
+    "AreaCsvWriter": "areawriter",
+    "write_area_csv": "areawriter",
+    "BatchJob": "batchscheduler",
+    "BatchScheduler": "batchscheduler",
+    "auto_chunksize": "chunking",
+    "resolve_chunksize": "chunking",
+    "Contrast": "contrast",
+    "FrameStore": "framestore",
+    "Imageprocess": "imageprocess",
+    "ImageProcessQWorker": "imageprocessqt",
+    "Imagestack": "imagestack",
+    "SaveOptions": "imagewriter",
+    "MaskArchive": "maskarchive",
+    "ParallelSubtractor": "parallel_subtractor",
+    "PoolSubtractor": "parallel_subtractor",
+    "ThreadSubtractor": "parallel_subtractor",
+    "WorkerError": "parallel_subtractor",
+    "PreviewPolicy": "preview",
+    "CachedRun": "resultcache",
+    "ResultCache": "resultcache",
+    "ResumeError": "resume",
+    "find_resume": "resume",
+    "run_params": "resume",
+    "RoiCollection": "roicollection",
+    "is_roi_json": "roicollection",
+    "ShardCoordinator": "sharding",
+    "ShardNode": "sharding",
+    "Subtractor": "subtractor",
+    "WarmPool": "warmpool",
+    "WorkerConfig": "workerconfig",
+    "calibrate_workers": "workerconfig",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
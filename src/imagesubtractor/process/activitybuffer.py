@@ -0,0 +1,58 @@
+import math
+import threading
+from typing import Tuple
+
+import numpy as np
+
+__all__ = ["ActivityBuffer"]
+
+
+class ActivityBuffer:
+    """the latest area vectors of a run, binned into a fixed-size ring.
+
+    Pair `num` is added to bin `num // decimation` and the ring keeps the
+    last `capacity` bins, each the mean area of its pairs, so the memory
+    and the cost of a snapshot do not grow with the run. With `processnum`
+    the decimation is chosen so the whole run fits in the ring.
+    """
+
+    def __init__(self, roinum: int, capacity: int = 512, processnum: int = 0):
+        self.roinum = roinum
+        self.capacity = capacity
+        self.decimation = max(math.ceil(processnum / capacity), 1)
+        self.bins = np.full(capacity, -1, dtype=np.int64)
+        self.sums = np.zeros((capacity, roinum), dtype=np.float64)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.last = -1
+        self.lock = threading.Lock()
+
+    def put(self, num: int, areadata: np.ndarray):
+        b = num // self.decimation
+        slot = b % self.capacity
+        with self.lock:
+            if b <= self.last - self.capacity:
+                # older than the ring, e.g. a late result after a long stall
+                return
+            if self.bins[slot] != b:
+                self.bins[slot] = b
+                self.sums[slot] = 0
+                self.counts[slot] = 0
+            self.sums[slot] += areadata
+            self.counts[slot] += 1
+            self.last = max(self.last, b)
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        """first pair of each bin and mean areas (bins x rois), oldest first"""
+        with self.lock:
+            if self.last < 0:
+                return np.zeros(0, dtype=np.int64), np.zeros((0, self.roinum))
+            first = max(self.last - self.capacity + 1, 0)
+            bins = np.arange(first, self.last + 1)
+            slots = bins % self.capacity
+            filled = self.bins[slots] == bins
+            # bins still waiting for their pairs are nan
+            means = np.full((len(bins), self.roinum), np.nan)
+            means[filled] = (
+                self.sums[slots[filled]] / self.counts[slots[filled], None]
+            )
+        return bins * self.decimation, means
@@ -0,0 +1,163 @@
+"""Binary outputs of the area matrix (pairs x rois).
+
+    npy       Area.npy, read back memory-mapped
+    npz       Area.npz, compressed `areas` and `frames` arrays
+    feather   Area.feather, one uint32 column per roi (needs pyarrow)
+    parquet   Area.parquet, same columns (needs pyarrow)
+
+Every binary output has a sidecar Area.meta.json with the roi order, the
+frame indices and file names of each pair and the run parameters; the
+feather and parquet files also carry it in their schema metadata.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+
+from ..utils import chmod_remove_executable, dump_json, load_json
+from .imagestack import Imagestack
+from .roicollection import RoiCollection
+
+__all__ = [
+    "AREA_FORMATS",
+    "area_metadata",
+    "write_area_matrix",
+    "read_area_matrix",
+    "read_area_metadata",
+    "write_area_metadata",
+]
+
+AREA_FORMATS = ("csv", "npy", "npz", "feather", "parquet")
+BINARY_FORMATS = AREA_FORMATS[1:]
+
+Columns = Optional[Union[slice, Sequence[int]]]
+
+
+def check_formats(formats: Sequence[str]) -> tuple:
+    unknown = set(formats) - set(AREA_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown area formats: {', '.join(sorted(unknown))}")
+    if {"feather", "parquet"} & set(formats):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("feather and parquet outputs need pyarrow") from None
+    return tuple(f for f in BINARY_FORMATS if f in formats)
+
+
+def area_metadata(
+    imagestack: Imagestack,
+    roicollection: RoiCollection,
+    start: int,
+    end: int,
+    step: int,
+    params: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """row i of the matrix is the pair (frames[i], frames[i + 1])"""
+    frames = list(range(start, end + 1, step))
+    return dict(
+        rois=[int(roi.order) for roi in roicollection],
+        frames=frames,
+        files=[imagestack.imagelist[i].name for i in frames],
+        params=params or {},
+    )
+
+
+def metadata_path(outputfile: Union[str, Path]) -> Path:
+    return Path(outputfile).with_name(Path(outputfile).stem + ".meta.json")
+
+
+def column_names(meta: Dict[str, Any], roinum: int):
+    rois = meta.get("rois") or list(range(roinum))
+    return [f"roi_{order}" for order in rois]
+
+
+def write_area_metadata(
+    outputfile: Union[str, Path],
+    outputarr: np.ndarray,
+    meta: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    meta = dict(meta or {}, shape=list(outputarr.shape), dtype=str(outputarr.dtype))
+    dump_json(metadata_path(outputfile), meta)
+    return meta
+
+
+def write_area_matrix(
+    outputfile: Union[str, Path],
+    outputarr: np.ndarray,
+    fmt: str,
+    meta: Optional[Dict[str, Any]] = None,
+) -> Path:
+    """write the matrix next to `outputfile` (Area.csv) in a binary format"""
+    outputfile = Path(outputfile).with_suffix("." + fmt)
+    meta = write_area_metadata(outputfile, outputarr, meta)
+    if fmt == "npy":
+        np.save(outputfile, outputarr)
+    elif fmt == "npz":
+        frames = np.asarray(meta.get("frames", []), dtype="i8")
+        np.savez_compressed(outputfile, areas=outputarr, frames=frames)
+    elif fmt in ("feather", "parquet"):
+        import pyarrow as pa
+
+        table = pa.table(
+            {
+                name: np.ascontiguousarray(outputarr[:, i])
+                for i, name in enumerate(column_names(meta, outputarr.shape[1]))
+            }
+        ).replace_schema_metadata({"imagesubtractor": json.dumps(meta)})
+        if fmt == "feather":
+            import pyarrow.feather as feather
+
+            feather.write_feather(table, os.fspath(outputfile), compression="lz4")
+        else:
+            import pyarrow.parquet as pq
+
+            pq.write_table(table, os.fspath(outputfile), compression="zstd")
+    else:
+        raise ValueError(f"Unknown binary area format: {fmt}")
+    chmod_remove_executable(outputfile)
+    return outputfile
+
+
+def read_area_metadata(path: Union[str, Path]) -> Dict[str, Any]:
+    return load_json(os.fspath(metadata_path(path))) or {}
+
+
+def read_area_matrix(
+    path: Union[str, Path], columns: Columns = None, mmap: bool = True
+) -> np.ndarray:
+    """read the matrix, or only the roi `columns`.
+
+    npy files are memory-mapped, feather and parquet files are read with
+    pyarrow's memory map and only the requested columns are loaded.
+    """
+    path = Path(path)
+    fmt = path.suffix.lstrip(".")
+    if fmt == "npy":
+        arr = np.load(path, mmap_mode="r" if mmap else None)
+        return arr if columns is None else arr[:, columns]
+    if fmt == "npz":
+        with np.load(path) as data:
+            arr = data["areas"]
+        return arr if columns is None else arr[:, columns]
+    if fmt in ("feather", "parquet"):
+        if fmt == "feather":
+            from pyarrow.feather import read_table
+        else:
+            from pyarrow.parquet import read_table
+
+        names = None
+        if columns is not None:
+            meta = read_area_metadata(path)
+            names = column_names(meta, meta.get("shape", [0, 0])[1])
+            if isinstance(columns, slice):
+                names = names[columns]
+            else:
+                names = [names[i] for i in columns]
+        table = read_table(os.fspath(path), columns=names, memory_map=mmap)
+        if not table.num_columns:
+            return np.zeros((table.num_rows, 0), dtype="u4")
+        return np.column_stack([c.to_numpy() for c in table.columns])
+    raise ValueError(f"Unknown binary area format: {path}")
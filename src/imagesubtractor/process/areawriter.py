@@ -0,0 +1,187 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+
+from ..utils import chmod_remove_executable, get_time
+from .areaformats import check_formats, write_area_matrix, write_area_metadata
+
+__all__ = ["write_area_csv", "AreaCsvWriter", "checkpoint_path"]
+
+
+def write_area_csv(outputfile: Path, outputarr: np.ndarray) -> Path:
+    # pandas is only needed here, keep it out of the start-up
+    import pandas as pd
+
+    pd.DataFrame(outputarr).to_csv(
+        outputfile,
+        index=False,
+        header=["Area"] * outputarr.shape[1],
+    )
+    chmod_remove_executable(outputfile)
+    return outputfile
+
+
+def checkpoint_path(outputfile: Union[str, Path]) -> Path:
+    # not a *.json, the roi lookups take the last json of the image folder
+    outputfile = Path(outputfile)
+    return outputfile.with_name(outputfile.name + ".ckpt")
+
+
+class AreaCsvWriter:
+    """Append the area rows to Area.csv while the run goes on.
+
+    Rows may arrive in any order, they are written in frame order as soon as
+    they are contiguous. Every `fsync_interval` seconds the file is synced
+    and a checkpoint record (rows and bytes on disk, run parameters) is
+    written next to it, so an interrupted run leaves a valid partial file.
+
+    With binary `formats` (npy, npz, feather, parquet) the rows are also
+    written to a memory-mapped Area.npy, the other formats are converted
+    from it once the run is complete.
+    """
+
+    def __init__(
+        self,
+        outputfile: Union[str, Path],
+        roinum: int,
+        processnum: Optional[int] = None,
+        params: Optional[Dict[str, Any]] = None,
+        fsync_interval: float = 10.0,
+        resume: Optional[Dict[str, Any]] = None,
+        formats: Sequence[str] = ("csv",),
+        meta: Optional[Dict[str, Any]] = None,
+    ):
+        self.outputfile = Path(outputfile)
+        self.checkpoint = checkpoint_path(self.outputfile)
+        self.roinum = roinum
+        self.processnum = processnum
+        self.params = params or {}
+        self.fsync_interval = fsync_interval
+        self.resume = resume
+        self.formats = check_formats(formats)
+        if self.formats and processnum is None:
+            raise ValueError("Binary area formats need the number of pairs")
+        self.meta = dict(meta or {}, params=self.params)
+        self.matrix: Optional[np.memmap] = None
+        self.pending: Dict[int, np.ndarray] = {}
+        self.rows = 0
+        self.file = None
+        self.last_sync = time.monotonic()
+
+    def __enter__(self) -> "AreaCsvWriter":
+        return self.open()
+
+    def __exit__(self, exc_type, *args):
+        self.close(complete=exc_type is None)
+
+    def open(self, resume: Optional[Dict[str, Any]] = None) -> "AreaCsvWriter":
+        """start a new file, or append to the rows of a checkpoint record"""
+        resume = resume or self.resume
+        if resume:
+            self.file = open(self.outputfile, mode="r+", newline="")
+            # drop the rows written after the last checkpoint
+            self.file.truncate(resume["bytes"])
+            self.file.seek(0, os.SEEK_END)
+            self.rows = resume["rows"]
+        else:
+            self.file = open(self.outputfile, mode="w", newline="")
+            self.file.write(",".join(["Area"] * self.roinum) + "\n")
+        if self.formats:
+            self.open_matrix(resume)
+        self.sync()
+        return self
+
+    def open_matrix(self, resume: Optional[Dict[str, Any]] = None):
+        path = self.outputfile.with_suffix(".npy")
+        shape = (self.processnum, self.roinum)
+        if resume and path.is_file():
+            self.matrix = np.lib.format.open_memmap(path, mode="r+")
+            if self.matrix.shape == shape:
+                return
+            del self.matrix
+        self.matrix = np.lib.format.open_memmap(
+            path, mode="w+", dtype="u4", shape=shape
+        )
+        if self.rows:
+            # rows of the partial run, the csv is already cut at the checkpoint
+            self.file.flush()
+            self.matrix[: self.rows] = np.loadtxt(
+                self.outputfile, dtype="u4", delimiter=",", skiprows=1, ndmin=2
+            )[: self.rows]
+
+    def write(self, num: int, areadata: np.ndarray):
+        if num < self.rows:
+            raise ValueError(f"Row {num} of {self.outputfile} is already written")
+        self.pending[num] = areadata
+        while self.rows in self.pending:
+            self.write_row(self.pending.pop(self.rows))
+        if time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def write_row(self, areadata: np.ndarray):
+        self.file.write(",".join(map(str, np.asarray(areadata).tolist())) + "\n")
+        if self.matrix is not None and self.rows < len(self.matrix):
+            self.matrix[self.rows] = areadata
+        self.rows += 1
+
+    def sync(self, complete: bool = False):
+        if self.matrix is not None:
+            self.matrix.flush()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        record = dict(
+            rows=self.rows,
+            bytes=os.fstat(self.file.fileno()).st_size,
+            processnum=self.processnum,
+            complete=complete,
+            updated=get_time(),
+            params=self.params,
+        )
+        tmpfile = self.checkpoint.with_name(self.checkpoint.name + ".tmp")
+        with open(tmpfile, mode="w") as file:
+            json.dump(record, file, indent=4)
+        os.replace(tmpfile, self.checkpoint)
+        chmod_remove_executable(self.checkpoint)
+        self.last_sync = time.monotonic()
+
+    def close(self, complete: bool = True):
+        """write what is left and sync.
+
+        A finished run fills missing rows with zeros like the in-memory
+        output did, an aborted one keeps only the contiguous rows.
+        """
+        if self.file is None:
+            return
+        if complete:
+            last = max(self.pending, default=-1) + 1
+            if self.processnum is not None:
+                last = max(last, self.processnum)
+            while self.rows < last:
+                self.write_row(
+                    self.pending.pop(self.rows, np.zeros(self.roinum, dtype="u4"))
+                )
+        self.sync(complete=complete)
+        self.file.close()
+        self.file = None
+        chmod_remove_executable(self.outputfile)
+        if self.matrix is not None:
+            if complete:
+                self.write_formats()
+            self.matrix = None
+
+    def write_formats(self):
+        matrix = self.outputfile.with_suffix(".npy")
+        for fmt in self.formats:
+            if fmt == "npy":
+                write_area_metadata(matrix, self.matrix, self.meta)
+                chmod_remove_executable(matrix)
+            else:
+                write_area_matrix(self.outputfile, self.matrix, fmt, self.meta)
+        if "npy" not in self.formats:
+            # only the working copy of the other formats
+            self.matrix = None
+            os.remove(matrix)
@@ -0,0 +1,268 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+from .areaformats import area_metadata
+from .areawriter import AreaCsvWriter
+from .imagestack import Imagestack
+from .imagewriter import SaveOptions
+from .preview import PreviewPolicy
+from .resultcache import CachedRun
+from .queue_item import ChunkResult, Result, Task, TaskChunk
+from .roicollection import RoiCollection
+from .subtractor import Subtractor
+from .warmpool import PoolJob, WarmPool
+from .worker import subtract_chunk_func, subtract_worker_func
+from .workerconfig import WorkerConfig
+
+__all__ = ["BatchJob", "BatchScheduler"]
+
+
+@dataclass
+class BatchJob:
+    """one image folder of a batch run"""
+
+    folder: Path
+    roicollection: RoiCollection
+    threshold: float
+    normalized: bool = False
+    start: int = 0
+    end: Optional[int] = None
+    step: int = 1
+    chunksize: int = 1
+    saveflag: Union[bool, SaveOptions] = False
+    deadline: Optional[float] = None
+    params: Optional[Dict[str, Any]] = None
+    resume: Optional[Dict[str, Any]] = None
+    formats: Sequence[str] = ("csv",)
+    cached: Optional[CachedRun] = None
+
+    imagestack: Imagestack = field(init=False, repr=False, default=None)
+    tasks: List[Union[Task, TaskChunk]] = field(init=False, repr=False, default=None)
+    processnum: int = field(init=False, default=0)
+    writer: Optional[AreaCsvWriter] = field(init=False, repr=False, default=None)
+    pooljob: Optional[PoolJob] = field(init=False, repr=False, default=None)
+    submitted: int = field(init=False, default=0)
+    finished: int = field(init=False, default=0)
+    # pairs measured by the workers, without the resumed and cached ones
+    computed: int = field(init=False, default=0)
+    skipped: int = field(init=False, default=0)
+    error: Optional[BaseException] = field(init=False, default=None)
+    started_at: float = field(init=False, default=0.0)
+
+    def prepare(self) -> "BatchJob":
+        self.folder = Path(self.folder)
+        if self.imagestack is None:
+            self.imagestack = Imagestack().set_folder(self.folder)
+        last = len(self.imagestack) - 1
+        end = last if self.end is None or self.end < 0 else min(self.end, last)
+        # pairs already in the Area.csv of an interrupted run
+        skip = self.resume["rows"] if self.resume else 0
+        cached = self.cached.hits if self.cached is not None else ()
+        if self.chunksize > 1:
+            self.processnum, self.tasks = self.imagestack.create_chunk_tasks(
+                self.start, end, self.step, self.chunksize, skip, cached
+            )
+        else:
+            self.processnum, self.tasks = self.imagestack.create_list_tasks(
+                self.start, end, self.step, skip, cached
+            )
+        return self
+
+    def open_writer(self) -> AreaCsvWriter:
+        end = self.start + self.processnum * self.step
+        meta = area_metadata(
+            self.imagestack, self.roicollection, self.start, end, self.step
+        )
+        self.writer = AreaCsvWriter(
+            self.folder.joinpath("Area.csv"),
+            len(self.roicollection),
+            self.processnum,
+            params=self.params,
+            resume=self.resume,
+            formats=self.formats,
+            meta=meta,
+        ).open()
+        if self.cached is not None:
+            for num, areadata in sorted(self.cached.hits.items()):
+                if num >= self.writer.rows:
+                    self.writer.write(num, areadata)
+        return self.writer
+
+    @property
+    def pending(self) -> int:
+        """tasks not yet submitted"""
+        return len(self.tasks) - self.submitted
+
+    @property
+    def done(self) -> bool:
+        return self.finished + self.skipped == len(self.tasks)
+
+    def store(self, res: Union[Result, ChunkResult]):
+        if self.writer is None or self.writer.file is None:
+            # late result of an interrupted job
+            return
+        results = res.split() if isinstance(res, ChunkResult) else (res,)
+        for num, _, areadata in results:
+            self.writer.write(num, areadata)
+            self.computed += 1
+            if self.cached is not None:
+                self.cached.put(num, areadata)
+
+
+PRIORITIES = {
+    # first in, first out
+    "fifo": lambda job: 0,
+    # small folders first, they are done (and written) early
+    "size": lambda job: job.processnum,
+    # large folders first, the small ones fill the tail
+    "largest": lambda job: -job.processnum,
+    # earliest deadline first, jobs without deadline last
+    "deadline": lambda job: (job.deadline is None, job.deadline or 0.0),
+}
+
+
+class BatchScheduler(threading.Thread):
+    """run many folders on one pool of workers.
+
+    Tasks of all jobs share `config.num_workers` workers: as soon as a job
+    has nothing left to submit, the next job's tasks fill the free workers,
+    so no worker waits for the tail of a folder. Each folder's Area.csv is
+    streamed to disk while it runs and closed in the background as soon as
+    its last pair is measured.
+    """
+
+    def __init__(
+        self,
+        jobs: List[BatchJob],
+        config: WorkerConfig = WorkerConfig(),
+        priority: str = "fifo",
+        max_inflight: Optional[int] = None,
+        warm_pool: Optional[WarmPool] = None,
+        on_job_done: Optional[Callable[[BatchJob], None]] = None,
+    ):
+        super().__init__(daemon=True)
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        self.jobs = jobs
+        self.config = config
+        self.priority = priority
+        self.max_inflight = max_inflight or 2 * config.num_workers
+        self.owns_pool = warm_pool is None
+        self.warm_pool = warm_pool or WarmPool()
+        self.on_job_done = on_job_done
+        self.isRunning = False
+
+    def submit_next(self, pool, queue: List[BatchJob], callback, error_callback):
+        job = next((j for j in queue if j.pending and j.error is None), None)
+        if job is None:
+            return False
+        if job.pooljob is None:
+            job.started_at = time.perf_counter()
+            job.open_writer()
+            chunked = isinstance(job.tasks[0], TaskChunk)
+            job.pooljob = self.warm_pool.bind(
+                subtract_chunk_func if chunked else subtract_worker_func,
+                roicollection=job.roicollection,
+                subtractor=Subtractor(job.threshold, job.normalized),
+                saveflag=job.saveflag,
+                preview=PreviewPolicy.areas_only(),
+            )
+        pool.apply_async(
+            job.pooljob,
+            (job.tasks[job.submitted],),
+            callback=lambda res: callback(job, res),
+            error_callback=lambda e: error_callback(job, e),
+        )
+        job.submitted += 1
+        return True
+
+    def finish_job(self, job: BatchJob):
+        self.warm_pool.release(job.pooljob)
+        elapse = time.perf_counter() - job.started_at
+        if job.error is not None:
+            print(f"[ERROR] {job.folder}: {job.error}")
+        job.writer.close(complete=job.error is None)
+        if job.cached is not None:
+            job.cached.close()
+        state = "Unfinished " if job.error is not None else ""
+        print(
+            f"[SYSTEM] {state}Area.csv was saved at {job.folder} "
+            f"({job.computed / max(elapse, 1e-9):.1f} pairs/s)"
+        )
+        if callable(self.on_job_done):
+            self.on_job_done(job)
+
+    def run(self):
+        self.isRunning = True
+        for job in self.jobs:
+            if not job.tasks and (job.resume or job.cached):
+                # every pair was written before the interruption or cached
+                job.open_writer().close()
+                if job.cached is not None:
+                    job.cached.close()
+        queue = sorted(
+            (job for job in self.jobs if job.tasks), key=PRIORITIES[self.priority]
+        )
+        cond = threading.Condition()
+        completed: List[BatchJob] = []
+        inflight = 0
+
+        def on_done(job: BatchJob, res):
+            nonlocal inflight
+            with cond:
+                job.store(res)
+                job.finished += 1
+                inflight -= 1
+                if job.done:
+                    completed.append(job)
+                cond.notify()
+
+        def on_error(job: BatchJob, e: BaseException):
+            nonlocal inflight
+            with cond:
+                job.error = job.error or e
+                # nothing else of this job is submitted
+                job.skipped += job.pending
+                job.submitted = len(job.tasks)
+                job.finished += 1
+                inflight -= 1
+                if job.done:
+                    completed.append(job)
+                cond.notify()
+
+        remaining = len(queue)
+        pool = self.warm_pool.get(self.config)
+        try:
+            # the csv files are written while the next folders are processed,
+            # leaving the block waits for them before the pool is shut down
+            with ThreadPoolExecutor(max_workers=1) as writer:
+                with cond:
+                    while remaining and self.isRunning:
+                        while inflight < self.max_inflight and self.submit_next(
+                            pool, queue, on_done, on_error
+                        ):
+                            inflight += 1
+                        while completed:
+                            writer.submit(self.finish_job, completed.pop(0))
+                            remaining -= 1
+                        if remaining:
+                            cond.wait(timeout=0.5)
+                    while completed:
+                        writer.submit(self.finish_job, completed.pop(0))
+        finally:
+            if self.owns_pool:
+                self.warm_pool.shutdown()
+            # keep the rows of interrupted jobs on disk
+            for job in queue:
+                if job.writer is not None and job.writer.file is not None:
+                    if not job.done:
+                        job.writer.close(complete=False)
+                if job.cached is not None:
+                    job.cached.close()
+
+    def kill_workers(self):
+        self.isRunning = False
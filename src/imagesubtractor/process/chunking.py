@@ -0,0 +1,77 @@
+import math
+import os
+import time
+from typing import Union
+
+import cv2
+
+from .imagestack import Imagestack
+from .roicollection import RoiCollection
+from .subtractor import Subtractor
+
+__all__ = ["measure_pair_time", "auto_chunksize", "resolve_chunksize"]
+
+
+def measure_pair_time(
+    file1: str,
+    file2: str,
+    roicollection: RoiCollection,
+    subtractor: Subtractor,
+    repeat: int = 2,
+) -> float:
+    """seconds spent on one pair, including both decodes"""
+    best = math.inf
+    for _ in range(max(repeat, 1)):
+        t1 = time.perf_counter()
+        _, _, binary = subtractor.compute(cv2.imread(file1), cv2.imread(file2))
+        roicollection.measureareas(binary)
+        best = min(best, time.perf_counter() - t1)
+    return best
+
+
+def auto_chunksize(
+    pair_time: float,
+    processnum: int,
+    num_workers: int,
+    target_sec: float = 0.25,
+    min_chunks_per_worker: int = 4,
+) -> int:
+    """pick the number of pairs per chunk.
+
+    A chunk should take about `target_sec` so the per-message overhead is
+    negligible, but every worker should still get `min_chunks_per_worker`
+    chunks to keep the load balanced at the end of the run.
+    """
+    chunksize = math.ceil(target_sec / max(pair_time, 1e-6))
+    upper = processnum // max(num_workers * min_chunks_per_worker, 1)
+    return max(min(chunksize, upper), 1)
+
+
+def resolve_chunksize(
+    chunksize: Union[int, str, None],
+    imagestack: Imagestack,
+    start: int,
+    end: int,
+    slicestep: int,
+    roicollection: RoiCollection,
+    subtractor: Subtractor,
+    num_workers: int,
+) -> int:
+    """return `chunksize` as a number of pairs, measuring it for "auto"."""
+    if chunksize is None:
+        return 1
+    if isinstance(chunksize, str):
+        if chunksize.lower() != "auto":
+            raise ValueError(f"Unknown chunksize: {chunksize}")
+        processnum = max(len(range(start, end + 1, slicestep)) - 1, 0)
+        if processnum < 2:
+            return 1
+        pair_time = measure_pair_time(
+            os.fspath(imagestack.imagelist[start]),
+            os.fspath(imagestack.imagelist[start + slicestep]),
+            roicollection,
+            subtractor,
+        )
+        chunksize = auto_chunksize(pair_time, processnum, num_workers)
+        print(f"[SYSTEM] {pair_time * 1000:.1f} ms/pair, chunk size: {chunksize}")
+    return max(int(chunksize), 1)
@@ -1,6 +1,23 @@
+import functools
+import math
+from typing import Any, Dict, Hashable
+
 import cv2
 import numpy as np
 
+# pixels sampled for the histogram, the frame is strided down to about this
+HIST_SAMPLES = 1 << 18
+
+
+@functools.lru_cache(maxsize=64)
+def make_lut(min_: int, max_: int) -> np.ndarray:
+    # make look up table with min max
+    lut = np.clip(np.arange(256, dtype=np.float64), min_, max_)
+    lut = (lut - min_) * 255 / (max_ - min_)
+    lut = lut.round(0).astype(np.uint8)
+    lut.flags.writeable = False
+    return lut
+
 
 class Contrast:
     def __init__(self):
@@ -8,6 +25,9 @@ class Contrast:
         self.imgwidth = 384
         self.min = 0
         self.max = 255
+        # histogram of the last frame before the range lines are drawn. The
+        # dict is shared with the copies handed to the preview renderer.
+        self.cache: Dict[str, Any] = {}
 
     def set_range(self, min_=0, max_=255) -> "Contrast":
         if isinstance(min_, int):
@@ -20,22 +40,35 @@ class Contrast:
     def adjusted(self) -> bool:
         return self.min != 0 or self.max != 255
 
-    def draw_histogram(self, image: np.ndarray) -> np.ndarray:
-        # font = cv2.FONT_HERSHEY_SIMPLEX
-        # do calc
-        # tempimage = self.ic.image
-        image = image
-        hist = cv2.calcHist([image], [0], None, [256], [0, 256])
-        points = self.get_points(hist)
-        histimagesorce = np.zeros((self.imgheight, self.imgwidth, 3), dtype=np.uint8)
-        cv2.fillPoly(histimagesorce, [points], (255, 204, 153))
-        histimage = np.fliplr(histimagesorce).astype(np.uint8)
+    def draw_histogram(self, image: np.ndarray, key: Hashable = None) -> np.ndarray:
+        """histogram of the first channel with the contrast range.
 
-        if self.adjusted:
-            histimage = self.drawaline(histimage)
+        With a `key` (e.g. the frame index) the histogram itself is kept, so
+        a new range of the same frame only redraws the lines.
+        """
+        cached = self.cache.get("hist")
+        if key is not None and cached is not None and cached[0] == key:
+            histimage = cached[1]
+        else:
+            histimage = self.draw_base_histogram(image)
+            if key is not None:
+                self.cache["hist"] = (key, histimage)
 
+        if self.adjusted:
+            return self.drawaline(histimage.copy())
         return histimage
 
+    def draw_base_histogram(self, image: np.ndarray) -> np.ndarray:
+        # a strided sample has the same shape of histogram, it is normalised
+        height, width = image.shape[:2]
+        stride = max(int(math.sqrt(height * width / HIST_SAMPLES)), 1)
+        sample = np.ascontiguousarray(image[::stride, ::stride])
+        hist = cv2.calcHist([sample], [0], None, [256], [0, 256])
+        points = self.get_points(hist)
+        histimagesorce = np.zeros((self.imgheight, self.imgwidth, 3), dtype=np.uint8)
+        cv2.fillPoly(histimagesorce, [points], (255, 204, 153))
+        return np.ascontiguousarray(np.fliplr(histimagesorce))
+
     def get_points(self, hist: np.ndarray):
         verts = np.linspace(0, 1, 257).repeat(4, axis=0).reshape(257 * 2, 2)
         verts[-1, 1] = 0.0
@@ -78,10 +111,7 @@ class Contrast:
         return cv2.addWeighted(image, 1.0, mask, 0.75, 1.0)
 
     def calclut(self) -> np.ndarray:
-        # make look up table with min max
-        lut = np.clip(np.arange(256, dtype=np.float64), self.min, self.max)
-        lut = (lut - self.min) * 255 / (self.max - self.min)
-        return lut.round(0).astype(np.uint8)
+        return make_lut(self.min, self.max)
 
     def draw_contrast(self, img: np.ndarray) -> np.ndarray:
         # use look up table
@@ -0,0 +1,104 @@
+"""Derived frames (subtract, blur or binary) stored in one container.
+
+A store is a directory with one pair of files per writer process:
+
+    blur.<pid>.raw   frames appended as raw bytes
+    blur.<pid>.idx   one record per frame: num, offset, height, width,
+                     channels and dtype
+
+so the workers append without sharing a file, and a frame is read back by
+its pair index without touching the other frames.
+"""
+import os
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+
+__all__ = ["FrameStore", "FrameStoreWriter"]
+
+_RECORD = np.dtype(
+    [
+        ("num", "<i8"),
+        ("offset", "<i8"),
+        ("height", "<i8"),
+        ("width", "<i8"),
+        ("channels", "<i8"),
+        ("dtype", "<i8"),
+    ]
+)
+
+
+class FrameStoreWriter:
+    def __init__(self, directory: Union[str, Path], name: str = "blur"):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stem = f"{name}.{os.getpid()}"
+        self.data = open(self.directory.joinpath(stem + ".raw"), mode="ab")
+        self.index = open(self.directory.joinpath(stem + ".idx"), mode="ab")
+
+    def append(self, num: int, img: np.ndarray) -> int:
+        img = np.ascontiguousarray(img)
+        offset = self.data.tell()
+        self.data.write(img.tobytes())
+        height, width = img.shape[:2]
+        channels = img.shape[2] if img.ndim > 2 else 0
+        record = (num, offset, height, width, channels, ord(img.dtype.char))
+        # the data goes first, a record always points to complete bytes
+        self.data.flush()
+        self.index.write(np.array([record], dtype=_RECORD).tobytes())
+        return img.nbytes
+
+    def sync(self):
+        for file in (self.data, self.index):
+            file.flush()
+            os.fsync(file.fileno())
+
+    def close(self):
+        self.sync()
+        self.data.close()
+        self.index.close()
+
+
+class FrameStore:
+    """read the frames of a store lazily, `store[num]` is a read-only view"""
+
+    def __init__(self, directory: Union[str, Path], name: str = "blur"):
+        self.directory = Path(directory)
+        self.name = name
+        self.frames: Dict[int, Tuple[Path, np.void]] = {}
+        self.maps: Dict[Path, np.memmap] = {}
+        self.refresh()
+
+    def refresh(self) -> "FrameStore":
+        """pick up the frames appended since the store was opened"""
+        for idx in sorted(self.directory.glob(f"{self.name}.*.idx")):
+            raw = idx.with_suffix(".raw")
+            count = idx.stat().st_size // _RECORD.itemsize
+            for record in np.fromfile(idx, dtype=_RECORD, count=count):
+                # the frame of a resumed run replaces the earlier one
+                self.frames[int(record["num"])] = (raw, record)
+        return self
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __contains__(self, num: int) -> bool:
+        return num in self.frames
+
+    @property
+    def nums(self) -> List[int]:
+        return sorted(self.frames)
+
+    def __getitem__(self, num: int) -> np.ndarray:
+        raw, record = self.frames[num]
+        dtype = np.dtype(chr(record["dtype"]))
+        shape = (int(record["height"]), int(record["width"]))
+        if record["channels"]:
+            shape += (int(record["channels"]),)
+        start = int(record["offset"])
+        stop = start + int(np.prod(shape)) * dtype.itemsize
+        buf = self.maps.get(raw)
+        if buf is None or len(buf) < stop:
+            buf = self.maps[raw] = np.memmap(raw, dtype="u1", mode="r")
+        return buf[start:stop].view(dtype).reshape(shape)
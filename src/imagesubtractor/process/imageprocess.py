@@ -1,11 +1,8 @@
 import queue
 import threading
 from pathlib import Path
-from typing import Dict
-
-import numpy as np
-import pandas as pd
 
+from .areawriter import AreaCsvWriter
 from .parallel_subtractor import ParallelSubtractor
 
 __all__ = ["Imageprocess"]
@@ -28,24 +25,17 @@ class Imageprocess(threading.Thread):
 
     def run(self):
         self.subtractors.start()
-        outputarr = np.zeros(
-            (
-                self.subtractors.processnum,
-                self.subtractors.roinum,
-            ),
-            dtype=int,
-        )
-        while True:
-            i, subtmedimg, areadata = self.subtractors.retrieve()
-            if i is None:
-                self.queue.put((None, subtmedimg))
-                break
-            self.queue.put((i, subtmedimg))
-            outputarr[i] = areadata
-
-        pd.DataFrame(outputarr).to_csv(
+        with AreaCsvWriter(
             self.outputfile,
-            index=False,
-            header=["Area" for _ in range(self.subtractors.roinum)],
-        )
+            self.subtractors.roinum,
+            self.subtractors.processnum,
+        ) as writer:
+            while True:
+                i, subtmedimg, areadata = self.subtractors.retrieve()
+                if i is None:
+                    self.queue.put((None, subtmedimg))
+                    break
+                self.queue.put((i, subtmedimg))
+                writer.write(i, areadata)
+
         print(f"[SYSTEM] area.csv was saved at {self.outputfile}")
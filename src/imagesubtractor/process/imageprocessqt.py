@@ -1,13 +1,16 @@
+import math
+import time
 from pathlib import Path
-from typing import Dict, Union
+from typing import Any, Dict, Optional, Sequence, Union
 
 import numpy as np
-import pandas as pd
 from PySide2 import QtCore
-from tqdm import tqdm
 
-from ..utils import chmod_remove_executable, timer
-from .parallel_subtractor import ParallelSubtractor, PoolSubtractor
+from ..utils import timer
+from .activitybuffer import ActivityBuffer
+from .areawriter import AreaCsvWriter
+from .parallel_subtractor import ParallelSubtractor, PoolSubtractor, ThreadSubtractor
+from .resultcache import CachedRun
 
 __all__ = ["ImageProcessQWorker"]
 
@@ -19,39 +22,93 @@ class ImageProcessQWorker(QtCore.QThread):
     def __init__(
         self,
         parent,
-        subtractor: Union[ParallelSubtractor, PoolSubtractor],
+        subtractor: Union[ParallelSubtractor, PoolSubtractor, ThreadSubtractor],
         outputdir: Path,
+        params: Optional[Dict[str, Any]] = None,
+        resume: Optional[Dict[str, Any]] = None,
+        formats: Sequence[str] = ("csv",),
+        meta: Optional[Dict[str, Any]] = None,
+        cached: Optional[CachedRun] = None,
+        fps: float = 20.0,
+        activity: Optional[ActivityBuffer] = None,
     ) -> "ImageProcessQWorker":
         super().__init__(parent=parent)
 
         self.subtractors = subtractor
         self.outputfile = Path(outputdir).joinpath("Area.csv")
+        # run parameters recorded in the checkpoint of Area.csv, and the
+        # checkpoint record of the partial run to append to
+        self.params = params
+        self.resume = resume
+        # extra binary outputs and their roi/frame metadata
+        self.formats = formats
+        self.meta = meta
+        # areas of the pairs measured by an earlier run, which were not queued
+        self.cached = cached
+        # process_result is sent at most `fps` times per second with the
+        # newest image, the frames in between only advance the count
+        self.interval = 1.0 / fps if fps > 0 else 0.0
+        self.last_shown = -math.inf
+        self.latest: Optional[np.ndarray] = None
+        # areas of the live activity plot
+        self.activity = activity
+
+    def show(self, num: int, img: Optional[np.ndarray], force: bool = False):
+        if img is not None:
+            self.latest = img
+        now = time.monotonic()
+        if force or now - self.last_shown >= self.interval:
+            self.process_result.emit((num, self.latest))
+            self.latest = None
+            self.last_shown = now
+
+    def write(self, writer: AreaCsvWriter, num: int, areadata: np.ndarray):
+        writer.write(num, areadata)
+        if self.activity is not None:
+            self.activity.put(num, areadata)
 
     def run(self):
+        from tqdm import tqdm
+
+        writer = AreaCsvWriter(
+            self.outputfile,
+            self.subtractors.roinum,
+            self.subtractors.processnum,
+            params=self.params,
+            formats=self.formats,
+            meta=self.meta,
+        )
         try:
+            writer.open(self.resume)
             self.subtractors.start()
-            outputarr = np.zeros(
-                (
-                    self.subtractors.processnum,
-                    self.subtractors.roinum,
-                ),
-                dtype="u4",
-            )
             with timer():
                 with tqdm(
                     desc=f"[{self.outputfile.parent}]",
                     total=self.subtractors.processnum,
+                    initial=writer.rows,
                 ) as tbar:
-                    count = 0
-                    cache: Dict[int, np.ndarray] = {}
+                    count = writer.rows
+                    # images are None for frames that were not sent as preview
+                    cache: Dict[int, Optional[np.ndarray]] = {}
+                    if self.cached is not None:
+                        for i, areadata in sorted(self.cached.hits.items()):
+                            if i >= count:
+                                cache[i] = None
+                                self.write(writer, i, areadata)
+                    while count in cache:
+                        self.show(count, cache.pop(count))
+                        tbar.update()
+                        count += 1
                     while True:
                         i, subtmedimg, areadata = self.subtractors.retrieve()
                         if i is None:
                             break
                         cache[i] = subtmedimg
-                        outputarr[i] = areadata
-                        if count in cache:
-                            self.process_result.emit((count, cache.pop(count)))
+                        self.write(writer, i, areadata)
+                        if self.cached is not None:
+                            self.cached.put(i, areadata)
+                        while count in cache:
+                            self.show(count, cache.pop(count))
                             tbar.update()
                             count += 1
 
@@ -59,27 +116,25 @@ class ImageProcessQWorker(QtCore.QThread):
                         (item for item in cache.items()), key=lambda item: item[0]
                     )
                     for i, img in cache_list:
-                        self.process_result.emit((i, img))
+                        self.show(i, img)
                         tbar.update()
+                    if cache_list:
+                        count = cache_list[-1][0] + 1
+                    if count:
+                        # the final count (and last image) is always shown
+                        self.show(count - 1, None, force=True)
                 cache_list = []
-                pd.DataFrame(outputarr).to_csv(
-                    self.outputfile,
-                    index=False,
-                    header=["Area"] * self.subtractors.roinum,
-                )
+                writer.close()
 
                 print(f"[SYSTEM] Area.csv was saved at {self.outputfile.parent}")
         except Exception as e:
-            pd.DataFrame(outputarr).to_csv(
-                self.outputfile,
-                index=False,
-                header=["Area"] * self.subtractors.roinum,
-            )
+            writer.close(complete=False)
             print(f"[ERROR] Unfinished Area.csv was saved at {self.outputfile.parent}")
             raise e
         finally:
             cache_list = []
-            chmod_remove_executable(self.outputfile)
+            if self.cached is not None:
+                self.cached.close()
             self.process_result.emit(None)
             self.finished.emit()
             self.subtractors.kill_workers()
@@ -1,16 +1,19 @@
+import hashlib
 import multiprocessing as mp
 import os
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Optional, Tuple, Union
+from typing import Container, Iterable, List, Optional, Tuple, Union
 
 import cv2
 from numpy import ndarray
 
-from .queue_item import Task
+from .queue_item import Task, TaskChunk
 
 __all__ = ["Imagestack"]
 
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+
 
 @dataclass
 class Imagestack:
@@ -22,20 +25,32 @@ class Imagestack:
     def __len__(self):
         return self.imagelist.__len__()
 
+    @staticmethod
+    def is_image(name: str) -> bool:
+        return name.lower().endswith(IMAGE_SUFFIXES) and not name.startswith(".")
+
     def set_folder(self, homedir: Union[str, Path]) -> "Imagestack":
         self.homedir = Path(homedir)
-        self.imagelist = sorted(
-            [
-                f
-                for f in self.homedir.glob("*.*")
-                if f.is_file()
-                and f.name.lower().endswith((".jpg", ".jpeg", ".png"))
-                and not f.name.startswith(".")
-            ],
-            key=lambda f: f.stem,
-        )
+        self.imagelist = []
+        if not self.homedir.is_dir():
+            return self
+        # the type of a scandir entry rarely needs a stat call
+        with os.scandir(self.homedir) as entries:
+            self.add_images(
+                Path(e.path) for e in entries if self.is_image(e.name) and e.is_file()
+            )
         if self.imagelist:
-            self.img_height, self.img_width = self.read_image(0).shape[:2]
+            self.set_size()
+        return self
+
+    def add_images(self, files: Iterable[Path]) -> "Imagestack":
+        """merge `files` into the sorted imagelist, which is replaced, not
+        modified, so a reader on another thread sees either list"""
+        self.imagelist = sorted([*self.imagelist, *files], key=lambda f: f.stem)
+        return self
+
+    def set_size(self, index: int = 0) -> "Imagestack":
+        self.img_height, self.img_width = self.read_image(index).shape[:2]
         return self
 
     def read_image(self, index: int) -> ndarray:
@@ -43,38 +58,112 @@ class Imagestack:
             raise IndexError()
         return cv2.imread(os.fspath(self.imagelist[index]))
 
+    def fingerprint(self, start: int, end: int, slicestep: int) -> str:
+        """hash of the names, sizes and mtimes of the frames in the range"""
+        digest = hashlib.sha1()
+        for i in range(start, end + 1, slicestep):
+            f = self.imagelist[i]
+            st = f.stat()
+            digest.update(f"{f.name}:{st.st_size}:{st.st_mtime_ns};".encode())
+        return digest.hexdigest()
+
     def create_task_queue(
         self,
         start: int,
         end: int,
         slicestep: int,
+        skip: int = 0,
+        cached: Container[int] = (),
     ) -> Tuple[int, mp.Queue]:
+        """`skip` leading pairs (already processed) and the `cached` pairs are
+        left out, the total number of pairs is returned anyway."""
+        processnum, tasks = self.create_list_tasks(
+            start, end, slicestep, skip, cached
+        )
         task = mp.Queue()
-        step_num = range(start, end + 1, slicestep)
-        for num, (img1, img2) in enumerate(zip(step_num[:-1], step_num[1:])):
-            task.put_nowait(
-                Task(
-                    num,
-                    os.fspath(self.imagelist[img1]),
-                    os.fspath(self.imagelist[img2]),
-                )
-            )
+        for t in tasks:
+            task.put_nowait(t)
         task.put_nowait(Task())
-        return num + 1, task
+        return processnum, task
 
     def create_list_tasks(
         self,
         start: int,
         end: int,
         slicestep: int,
+        skip: int = 0,
+        cached: Container[int] = (),
     ) -> Tuple[int, List[Task]]:
         step_num = range(start, end + 1, slicestep)
+        processnum = max(len(step_num) - 1, 0)
         tasks = [
             Task(
                 num,
-                os.fspath(self.imagelist[img1]),
-                os.fspath(self.imagelist[img2]),
+                os.fspath(self.imagelist[step_num[num]]),
+                os.fspath(self.imagelist[step_num[num + 1]]),
             )
-            for num, (img1, img2) in enumerate(zip(step_num[:-1], step_num[1:]))
+            for num in range(skip, processnum)
+            if num not in cached
         ]
-        return len(tasks), tasks
+        return processnum, tasks
+
+    def create_chunk_tasks(
+        self,
+        start: int,
+        end: int,
+        slicestep: int,
+        chunksize: int,
+        skip: int = 0,
+        cached: Container[int] = (),
+    ) -> Tuple[int, List[TaskChunk]]:
+        """split the pairs into chunks of `chunksize` pairs.
+
+        Neighbouring chunks share their boundary frame. A chunk never spans
+        a `cached` pair.
+        """
+        chunksize = max(int(chunksize), 1)
+        step_num = range(start, end + 1, slicestep)
+        processnum = max(len(step_num) - 1, 0)
+        tasks = []
+        num = skip
+        while num < processnum:
+            if num in cached:
+                num += 1
+                continue
+            size = 1
+            while (
+                size < chunksize
+                and num + size < processnum
+                and num + size not in cached
+            ):
+                size += 1
+            frames = step_num[num : num + size + 1]
+            tasks.append(
+                TaskChunk(
+                    num,
+                    frames.start,
+                    frames.stop,
+                    slicestep,
+                    tuple(os.fspath(self.imagelist[i]) for i in frames),
+                )
+            )
+            num += size
+        return processnum, tasks
+
+    def create_chunk_queue(
+        self,
+        start: int,
+        end: int,
+        slicestep: int,
+        chunksize: int,
+        skip: int = 0,
+        cached: Container[int] = (),
+    ) -> Tuple[int, mp.Queue]:
+        processnum, chunks = self.create_chunk_tasks(
+            start, end, slicestep, chunksize, skip, cached
+        )
+        task = mp.Queue()
+        for chunk in chunks:
+            task.put_nowait(chunk)
+        task.put_nowait(TaskChunk())
+        return processnum, task
@@ -0,0 +1,213 @@
+import os
+import queue
+import threading
+import time
+from multiprocessing import util
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from .framestore import FrameStoreWriter
+from .maskarchive import MaskArchiveWriter
+
+__all__ = ["SaveOptions", "ImageWriter", "image_writer", "close_image_writer"]
+
+
+class SaveOptions(NamedTuple):
+    """how the derived frames are saved.
+
+    `stack` is the saved image of each pair (subtract, blur or binary) and
+    `fmt` is either an image format (one file per pair), "stack", one
+    FrameStore container, or "mask", the MaskArchive of the binary images
+    (packed to 1 bit per pixel). `compression` depends on the format: the PNG
+    level (0-9), the TIFF compression code (1 none, 5 LZW, 8 deflate) or
+    the JPEG quality (0-100). The written files are fsynced every
+    `fsync_batch` frames (0: never). The frames go to `outputdir`, by
+    default a "<folder>_derived" folder next to the image folder.
+    """
+
+    fmt: str = "tif"
+    compression: Optional[int] = None
+    queue_size: int = 64
+    fsync_batch: int = 256
+    stack: str = "blur"
+    outputdir: Optional[str] = None
+
+    @classmethod
+    def from_flag(cls, saveflag: Union[bool, "SaveOptions"]) -> "SaveOptions":
+        return saveflag if isinstance(saveflag, SaveOptions) else cls()
+
+    def output_folder(self, imagedir: Union[str, Path]) -> Path:
+        if self.outputdir is not None:
+            return Path(self.outputdir)
+        imagedir = Path(imagedir)
+        return imagedir.with_name(imagedir.name + "_derived")
+
+    @property
+    def image(self) -> str:
+        """which image of the pair is saved"""
+        return "binary" if self.fmt == "mask" else self.stack
+
+    def filename(self, num: int) -> str:
+        name = "sub" if self.stack == "blur" else self.stack
+        return f"{num:0>6}_{name}.{self.fmt}"
+
+    def imwrite_params(self) -> List[int]:
+        if self.compression is None or self.fmt in ("stack", "mask"):
+            return []
+        flag = {
+            "png": cv2.IMWRITE_PNG_COMPRESSION,
+            "tif": cv2.IMWRITE_TIFF_COMPRESSION,
+            "jpg": cv2.IMWRITE_JPEG_QUALITY,
+        }[self.fmt]
+        return [flag, int(self.compression)]
+
+
+class ImageWriter(threading.Thread):
+    """write images from a bounded queue, off the compute loop.
+
+    `put` only blocks when `queue_size` images are waiting, so a slow disk
+    throttles the workers instead of filling the memory. A summary is
+    printed on `close` instead of one line per file.
+    """
+
+    def __init__(self, options: SaveOptions = SaveOptions()):
+        super().__init__(daemon=True)
+        self.options = options
+        self.queue: queue.Queue = queue.Queue(maxsize=options.queue_size)
+        self.params = options.imwrite_params()
+        self.stores: Dict[Path, Union[FrameStoreWriter, MaskArchiveWriter]] = {}
+        self.dirs = set()
+        self.unsynced: List[str] = []
+        self.since_sync = 0
+        self.count = 0
+        self.failed = 0
+        self.nbytes = 0
+        self.elapse = 0.0
+
+    def put(self, outputdir: Path, num: int, img: np.ndarray):
+        # never wait on a queue that nobody empties
+        while True:
+            if not self.is_alive():
+                raise RuntimeError(f"The image writer of process {os.getpid()} stopped")
+            try:
+                self.queue.put((outputdir, num, img), timeout=1.0)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, outputdir: Path, num: int, img: np.ndarray):
+        if self.options.fmt in ("stack", "mask"):
+            store = self.stores.get(outputdir)
+            if store is None:
+                store = self.stores[outputdir] = (
+                    MaskArchiveWriter(outputdir)
+                    if self.options.fmt == "mask"
+                    else FrameStoreWriter(outputdir, self.options.stack)
+                )
+            self.nbytes += store.append(num, img)
+            self.count += 1
+            return
+        if outputdir not in self.dirs:
+            outputdir.mkdir(parents=True, exist_ok=True)
+            self.dirs.add(outputdir)
+        path = os.fspath(outputdir.joinpath(self.options.filename(num)))
+        if cv2.imwrite(path, img, self.params):
+            self.count += 1
+            self.nbytes += os.path.getsize(path)
+            self.unsynced.append(path)
+        else:
+            self.failed += 1
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            t1 = time.perf_counter()
+            try:
+                self.write(*item)
+                self.since_sync += 1
+                if (
+                    self.options.fsync_batch
+                    and self.since_sync >= self.options.fsync_batch
+                ):
+                    self.sync()
+            except Exception as e:
+                # one bad image does not stop the others
+                self.fail(item[1], e)
+            self.elapse += time.perf_counter() - t1
+        try:
+            if self.options.fsync_batch:
+                self.sync()
+            for store in self.stores.values():
+                store.close()
+        except Exception as e:
+            self.fail(None, e)
+
+    def fail(self, num: Optional[int], e: Exception):
+        self.failed += 1
+        if self.failed == 1:
+            # the first error only, the count is in the summary of close
+            print(f"[ERROR] process {os.getpid()} could not save image {num}: {e}")
+
+    def sync(self):
+        self.since_sync = 0
+        for store in self.stores.values():
+            store.sync()
+        dirs = set()
+        for path in self.unsynced:
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            dirs.add(os.path.dirname(path))
+        self.unsynced.clear()
+        if os.name != "posix":
+            return
+        for d in dirs:
+            fd = os.open(d or ".", os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def close(self):
+        if not self.is_alive():
+            return
+        self.queue.put(None)
+        self.join()
+        if self.count or self.failed:
+            failed = f", {self.failed} failed" if self.failed else ""
+            print(
+                f"[SYSTEM] process {os.getpid()} saved {self.count} images"
+                f"{failed} ({self.nbytes / 1e6:.1f} MB, {self.elapse:.1f} s)"
+            )
+
+
+# one writer per process and options, recreated in forked children
+_writers: Dict[SaveOptions, Tuple[int, ImageWriter]] = {}
+_writers_lock = threading.Lock()
+
+
+def image_writer(options: SaveOptions = SaveOptions()) -> ImageWriter:
+    with _writers_lock:
+        pid, writer = _writers.get(options, (None, None))
+        if pid != os.getpid():
+            writer = ImageWriter(options)
+            writer.start()
+            _writers[options] = (os.getpid(), writer)
+            # flushed when the worker process (or the program) exits normally
+            util.Finalize(writer, writer.close, exitpriority=10)
+        return writer
+
+
+def close_image_writer(options: SaveOptions = SaveOptions()):
+    """flush the writer of this process, the next image_writer starts anew"""
+    with _writers_lock:
+        pid, writer = _writers.pop(options, (None, None))
+    if writer is not None and pid == os.getpid():
+        writer.close()
@@ -0,0 +1,99 @@
+"""Archive of the thresholded masks, to measure new rois without recomputing.
+
+Each mask is packed to 1 bit per pixel with `np.packbits`, compressed with
+zlib and appended to a FrameStore named "mask"; mask.json keeps the shape
+of the masks. `MaskArchive.remeasure` applies a RoiCollection to all the
+masks with summed-area tables, a batch of frames at a time.
+"""
+import os
+import zlib
+from pathlib import Path
+from typing import Tuple, Union
+
+import numpy as np
+
+from ..utils import dump_json, load_json
+from .framestore import FrameStore, FrameStoreWriter
+from .roicollection import RoiCollection
+
+__all__ = ["MaskArchive", "MaskArchiveWriter"]
+
+
+class MaskArchiveWriter:
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        self.store = FrameStoreWriter(self.directory, "mask")
+        self.shape = None
+
+    def append(self, num: int, binary: np.ndarray) -> int:
+        if self.shape is None:
+            self.shape = binary.shape
+            meta = self.directory.joinpath("mask.json")
+            if not meta.exists():
+                dump_json(meta, dict(shape=list(binary.shape)))
+        packed = np.packbits(binary.astype(bool), axis=None)
+        blob = zlib.compress(packed.tobytes(), 1)
+        # a FrameStore record is at least 2-D, the blob is one row
+        return self.store.append(num, np.frombuffer(blob, dtype="u1")[None, :])
+
+    def sync(self):
+        self.store.sync()
+
+    def close(self):
+        self.store.close()
+
+
+class MaskArchive:
+    def __init__(self, directory: Union[str, Path]):
+        self.directory = Path(directory)
+        meta = load_json(os.fspath(self.directory.joinpath("mask.json")))
+        if meta is None:
+            raise FileNotFoundError(f"No mask archive in {directory}")
+        self.shape = tuple(meta["shape"])
+        self.store = FrameStore(self.directory, "mask")
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    @property
+    def nums(self):
+        return self.store.nums
+
+    def __getitem__(self, num: int) -> np.ndarray:
+        """the binary mask (0 or 1) of pair `num`"""
+        packed = np.frombuffer(zlib.decompress(self.store[num]), dtype="u1")
+        size = int(np.prod(self.shape))
+        return np.unpackbits(packed, count=size).reshape(self.shape)
+
+    def remeasure(
+        self, roicollection: RoiCollection, batch: int = 64
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """pair indices and areas (pairs x rois) of every archived mask.
+
+        Gives the same areas as `RoiCollection.measureareas` on the masks.
+        """
+        nums = np.asarray(self.nums, dtype=int)
+        areas = np.zeros((len(nums), len(roicollection)), dtype="u4")
+        height, width = self.shape[:2]
+        channels = self.shape[2] if len(self.shape) > 2 else 1
+        # Roi.measurearea includes the right and bottom edges
+        x0 = np.array([min(max(r.x, 0), width) for r in roicollection], dtype=int)
+        y0 = np.array([min(max(r.y, 0), height) for r in roicollection], dtype=int)
+        x1 = np.array(
+            [min(max(r.x + r.width + 1, 0), width) for r in roicollection], dtype=int
+        )
+        y1 = np.array(
+            [min(max(r.y + r.height + 1, 0), height) for r in roicollection],
+            dtype=int,
+        )
+        for start in range(0, len(nums), batch):
+            masks = np.stack([self[int(n)] for n in nums[start : start + batch]])
+            if masks.ndim > 3:
+                masks = masks.sum(axis=3, dtype="u4")
+            table = np.zeros((len(masks), height + 1, width + 1), dtype="u4")
+            np.cumsum(masks, axis=1, dtype="u4", out=table[:, 1:, 1:])
+            np.cumsum(table[:, 1:, 1:], axis=2, dtype="u4", out=table[:, 1:, 1:])
+            sums = table[:, y1, x1] - table[:, y0, x1]
+            sums += table[:, y0, x0] - table[:, y1, x0]
+            areas[start : start + len(masks)] = sums // channels
+        return nums, areas
@@ -1,26 +1,49 @@
+import collections
+import contextlib
 import functools
 import multiprocessing as mp
-import os
+import queue
 import threading
-from typing import List
+from multiprocessing.pool import ThreadPool
+from typing import Deque, Dict, List, Optional, Union
 
-from .queue_item import Result, Task
+from .imagewriter import SaveOptions, close_image_writer
+from .preview import PreviewPolicy
+from .queue_item import ChunkResult, Result, Task, TaskChunk
 from .roicollection import RoiCollection
 from .subtractor import Subtractor
-from .worker import SubtractorWorker, subtract_worker_func
+from .warmpool import WarmPool
+from .worker import SubtractorWorker, subtract_chunk_func, subtract_worker_func
+from .workerconfig import WorkerConfig, available_cpus, init_pool_worker
 
-__all__ = ["ParallelSubtractor", "PoolSubtractor"]
+__all__ = ["ParallelSubtractor", "PoolSubtractor", "ThreadSubtractor", "WorkerError"]
+
+
+class WorkerError(RuntimeError):
+    """raised by `retrieve` at the end of a run in which tasks failed"""
+
+    @classmethod
+    def check(cls, errors: List[BaseException]):
+        if errors:
+            raise cls(f"{len(errors)} task(s) failed, the first with: {errors[0]!r}")
 
 
 class ParallelSubtractor(threading.Thread):
     def __init__(
         self,
-        num_workers: int = min(os.cpu_count() - 1, 3),
+        num_workers: Optional[int] = None,
+        cv_threads: int = 1,
+        affinity: bool = False,
     ) -> None:
         super().__init__(daemon=True)
         self.output_queue: mp.Queue = mp.Queue()
-        self.num_workers = num_workers
+        self.config = WorkerConfig(
+            num_workers or WorkerConfig().num_workers, cv_threads, affinity
+        )
+        self.num_workers = self.config.num_workers
         self.workers = []
+        self.pending: Deque[Result] = collections.deque()
+        self.errors: List[BaseException] = []
 
     def setup_workers(
         self,
@@ -29,7 +52,8 @@ class ParallelSubtractor(threading.Thread):
         roicollection: RoiCollection,
         threshold: float,
         normalized: bool,
-        saveflag: bool = False,
+        saveflag: Union[bool, SaveOptions] = False,
+        preview: PreviewPolicy = PreviewPolicy(),
     ) -> "ParallelSubtractor":
 
         self.processnum = processnum
@@ -41,8 +65,11 @@ class ParallelSubtractor(threading.Thread):
                 roicollection,
                 subtractor=Subtractor(threshold, normalized),
                 saveflag=saveflag,
+                preview=preview,
+                cv_threads=self.config.cv_threads,
+                cpus=cpus,
             )
-            for _ in range(self.num_workers)
+            for cpus in self.config.cpu_sets()
         ]
         return self
 
@@ -52,17 +79,32 @@ class ParallelSubtractor(threading.Thread):
                 p.start()
             for p in self.workers:
                 p.join()
+            # a worker that raised took its task with it
+            self.errors.extend(
+                RuntimeError(f"worker {p.pid} exited with code {p.exitcode}")
+                for p in self.workers
+                if p.exitcode
+            )
         except Exception as e:
-            print(e)
+            self.errors.append(e)
             self.kill_workers()
         finally:
+            for e in self.errors:
+                print(f"[ERROR] {e}")
             self.output_queue.put(Result())
 
     def retrieve(self) -> Result:
-        return self.output_queue.get()
+        if not self.pending:
+            res = self.output_queue.get()
+            if not isinstance(res, ChunkResult):
+                if res.num is None:
+                    WorkerError.check(self.errors)
+                return res
+            self.pending.extend(res.split())
+        return self.pending.popleft()
 
     def empty(self) -> bool:
-        return self.output_queue.qsize() == 0
+        return not self.pending and self.output_queue.qsize() == 0
 
     def kill_workers(self) -> None:
         try:
@@ -74,34 +116,61 @@ class ParallelSubtractor(threading.Thread):
 
 
 class PoolSubtractor(threading.Thread):
+    pool_class = mp.Pool
+
     def __init__(
         self,
-        num_workers: int = min(os.cpu_count() - 1, 3),
+        num_workers: Optional[int] = None,
+        max_inflight: Optional[int] = None,
+        reorder_window: Optional[int] = None,
+        cv_threads: int = 1,
+        affinity: bool = False,
+        warm_pool: Optional[WarmPool] = None,
     ):
         super().__init__(daemon=True)
         self.output_queue: mp.Queue = mp.Queue()
-        self.num_workers = num_workers
+        # a long-lived pool shared between runs, only the job parameters are
+        # sent to its workers
+        self.warm_pool = warm_pool
+        self.config = WorkerConfig(
+            num_workers or WorkerConfig().num_workers, cv_threads, affinity
+        )
+        self.num_workers = self.config.num_workers
+        # at most `max_inflight` tasks are submitted to the pool at once and
+        # a task is only submitted when it is less than `reorder_window`
+        # positions ahead of the next result to emit.
+        self.max_inflight = max_inflight or 2 * self.num_workers
+        self.reorder_window = max(reorder_window or 0, self.max_inflight)
         self.process_func = None
+        self.saveflag = False
         self.tasks = []
+        self.errors: List[BaseException] = []
 
     def setup_pool(
         self,
         processnum: int,
-        tasks: List[Task],
+        tasks: List[Union[Task, TaskChunk]],
         roicollection: RoiCollection,
         threshold: float,
         normalized: bool,
-        saveflag: bool = False,
+        saveflag: Union[bool, SaveOptions] = False,
+        preview: PreviewPolicy = PreviewPolicy(),
     ) -> "PoolSubtractor":
 
         self.processnum = processnum
         self.roinum = len(roicollection)
-        self.process_func = functools.partial(
-            subtract_worker_func,
+        chunked = bool(tasks) and isinstance(tasks[0], TaskChunk)
+        bind = functools.partial
+        if self.warm_pool is not None:
+            bind = self.warm_pool.bind
+        self.process_func = bind(
+            subtract_chunk_func if chunked else subtract_worker_func,
             roicollection=roicollection,
             subtractor=Subtractor(threshold, normalized),
             saveflag=saveflag,
+            preview=preview,
         )
+        self.saveflag = saveflag
         self.isRunning = False
         self.tasks = tasks
         return self
@@ -111,26 +180,136 @@ class PoolSubtractor(threading.Thread):
             raise ValueError("Did not set up the pool function!")
 
         self.isRunning = True
-        with mp.Pool(self.num_workers) as pool:
-            results = (pool.apply_async(self.process_func, (t,)) for t in self.tasks)
+        total = len(self.tasks)
+        cond = threading.Condition()
+        done: Dict[int, Result] = {}
+        errors: List[BaseException] = []
+        inflight = 0
+
+        def on_done(pos: int, res: Result):
+            nonlocal inflight
+            with cond:
+                done[pos] = res
+                inflight -= 1
+                cond.notify()
 
-            for res in results:
-                if not self.isRunning:
-                    pool.terminate()
-                    break
-                self.output_queue.put(res.get())
+        def on_error(e: BaseException):
+            nonlocal inflight
+            with cond:
+                errors.append(e)
+                inflight -= 1
+                cond.notify()
 
+        # the callbacks run in the pool's result thread, so the lock must be
+        # released before leaving the pool context (which terminates it,
+        # except for a warm pool).
+        with self.create_pool() as pool:
+            with cond:
+                submitted, emitted = 0, 0
+                while emitted < total and self.isRunning and not errors:
+                    while (
+                        submitted < total
+                        and inflight < self.max_inflight
+                        and submitted - emitted < self.reorder_window
+                    ):
+                        pool.apply_async(
+                            self.process_func,
+                            (self.tasks[submitted],),
+                            callback=functools.partial(on_done, submitted),
+                            error_callback=on_error,
+                        )
+                        submitted += 1
+                        inflight += 1
+                    # emit in task order as soon as the head of the window is done
+                    while emitted in done:
+                        res = done.pop(emitted)
+                        if isinstance(res, ChunkResult):
+                            for r in res.split():
+                                self.output_queue.put(r)
+                        else:
+                            self.output_queue.put(res)
+                        emitted += 1
+                    if emitted < total:
+                        cond.wait(timeout=0.5)
+                # after a failure or a cancel, wait for the submitted tasks:
+                # terminating a pool while a worker sends its result deadlocks
+                while inflight:
+                    cond.wait(timeout=0.5)
+            if self.saveflag and self.warm_pool is None and not errors:
+                # let the workers exit normally, their image writers are
+                # flushed on exit (the context would terminate them)
+                pool.close()
+                pool.join()
+
+        if self.warm_pool is not None:
+            self.warm_pool.release(self.process_func)
+        for e in errors:
+            print(f"[ERROR] {e!r}")
+        # before the end marker, retrieve raises them when it gets there
+        self.errors.extend(errors)
+        self.flush_saved()
         self.output_queue.put(Result())
 
+    def flush_saved(self):
+        # the workers of a pool flush their image writers when they exit
+        pass
+
+    def create_pool(self):
+        if self.warm_pool is not None:
+            return contextlib.nullcontext(self.warm_pool.get(self.config))
+        return self.pool_class(
+            self.num_workers,
+            initializer=init_pool_worker,
+            initargs=(self.config.cv_threads, self.config.cpu_queue()),
+        )
+
     def retrieve(self) -> Result:
         try:
-            return self.output_queue.get()
+            res = self.output_queue.get()
         except Exception as e:
             print(e)
-            return Result()
+            res = Result()
+        if res.num is None:
+            WorkerError.check(self.errors)
+        return res
 
     def empty(self) -> bool:
         return self.output_queue.qsize() == 0
 
     def kill_workers(self):
         self.isRunning = False
+
+
+class ThreadSubtractor(PoolSubtractor):
+    """PoolSubtractor running the tasks on threads of this process.
+
+    Decoding, median blur, thresholding and most numpy operations release
+    the GIL, so threads avoid spawning processes and pickling the
+    RoiCollection, the Subtractor and every Result. The Subtractor is
+    shared between the threads and only its stateless `compute` is used.
+    The OpenCV thread count and cpu affinity are process wide, so they are
+    left untouched here.
+    """
+
+    pool_class = ThreadPool
+
+    def __init__(
+        self,
+        num_workers: Optional[int] = None,
+        max_inflight: Optional[int] = None,
+        reorder_window: Optional[int] = None,
+    ):
+        super().__init__(
+            num_workers or len(available_cpus()), max_inflight, reorder_window
+        )
+        self.output_queue: queue.Queue = queue.Queue()
+
+    def create_pool(self):
+        if self.warm_pool is not None:
+            return contextlib.nullcontext(self.warm_pool.get(self.config))
+        return self.pool_class(self.num_workers)
+
+    def flush_saved(self):
+        # the threads share the writer of this process, which outlives the run
+        if self.saveflag:
+            close_image_writer(SaveOptions.from_flag(self.saveflag))
@@ -0,0 +1,64 @@
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict
+
+__all__ = ["PreviewPolicy"]
+
+# clocks of the policies unpickled in this process, by policy key. A pool
+# without a warm pool unpickles the policy again with every task, the copies
+# of one policy keep sharing its clock.
+_clocks: "OrderedDict[str, Dict[int, float]]" = OrderedDict()
+_CLOCKS_SIZE = 4
+
+
+class PreviewPolicy:
+    """Decide which processed frames ship their subtract image back.
+
+    every_n: send the image of every n-th frame (0 disables).
+    every_sec: send at most one image per `every_sec` seconds and worker
+        (0 disables).
+    When both are disabled the workers only return the area vector.
+    """
+
+    def __init__(self, every_n: int = 1, every_sec: float = 0.0):
+        self.every_n = every_n
+        self.every_sec = every_sec
+        self.key = uuid.uuid4().hex
+        # time of the last image sent, by worker thread
+        self.last_sent: Dict[int, float] = {}
+
+    def __repr__(self) -> str:
+        return f"PreviewPolicy(every_n={self.every_n}, every_sec={self.every_sec})"
+
+    def __getstate__(self):
+        return self.every_n, self.every_sec, self.key
+
+    def __setstate__(self, state):
+        self.every_n, self.every_sec, self.key = state
+        self.last_sent = _clocks.setdefault(self.key, {})
+        _clocks.move_to_end(self.key)
+        while len(_clocks) > _CLOCKS_SIZE:
+            _clocks.popitem(last=False)
+
+    @classmethod
+    def areas_only(cls) -> "PreviewPolicy":
+        return cls(every_n=0, every_sec=0.0)
+
+    @property
+    def enabled(self) -> bool:
+        return self.every_n > 0 or self.every_sec > 0
+
+    def want(self, num: int) -> bool:
+        worker = threading.get_ident()
+        if self.every_n > 0 and num % self.every_n == 0:
+            self.last_sent[worker] = time.monotonic()
+            return True
+        if self.every_sec > 0:
+            now = time.monotonic()
+            if now - self.last_sent.get(worker, -math.inf) >= self.every_sec:
+                self.last_sent[worker] = now
+                return True
+        return False
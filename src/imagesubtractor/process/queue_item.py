@@ -1,8 +1,8 @@
-from typing import NamedTuple, Optional
+from typing import Iterator, NamedTuple, Optional, Tuple
 
 from numpy import ndarray
 
-__all__ = ["Task", "Result"]
+__all__ = ["Task", "Result", "TaskChunk", "ChunkResult"]
 
 
 class Task(NamedTuple):
@@ -16,3 +16,32 @@ class Result(NamedTuple):
     image: Optional[ndarray] = None
     data: Optional[ndarray] = None
 
+
+class TaskChunk(NamedTuple):
+    """consecutive pairs of the frame range(start, stop, step).
+
+    num is the index of the first pair, files holds the paths of every frame
+    in the range, so the chunk covers len(files) - 1 pairs.
+    """
+
+    num: Optional[int] = None
+    start: Optional[int] = None
+    stop: Optional[int] = None
+    step: int = 1
+    files: Tuple[str, ...] = ()
+
+    @property
+    def npairs(self) -> int:
+        return max(len(self.files) - 1, 0)
+
+
+class ChunkResult(NamedTuple):
+    """area matrix (pairs x rois) of a TaskChunk and its preview images"""
+
+    num: Optional[int] = None
+    images: Tuple[Optional[ndarray], ...] = ()
+    data: Optional[ndarray] = None
+
+    def split(self) -> Iterator[Result]:
+        for k, (image, areadata) in enumerate(zip(self.images, self.data)):
+            yield Result(self.num + k, image, areadata)
@@ -0,0 +1,142 @@
+"""Cache of the area vectors of already measured pairs.
+
+The areas of a pair only depend on the two frames, the rois and the
+subtractor parameters. Each set of rois and parameters has a directory
+named after their hash, in which every pair is stored under the hash of
+the names, sizes and mtimes of its two frames:
+
+    <cache>/<run key>/pairs.<pid>.bin   records of (pair key, areas)
+
+so a repeated run, or another range of the same folder, only computes the
+pairs that are not in the cache. The least recently used directories are
+removed when the cache grows over `max_bytes`.
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from .imagestack import Imagestack
+from .roicollection import RoiCollection
+from .subtractor import Subtractor
+
+__all__ = ["ResultCache", "CachedRun"]
+
+
+def default_cache_dir() -> Path:
+    path = os.environ.get("IMAGESUBTRACTOR_CACHE")
+    if path:
+        return Path(path)
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")).joinpath(
+        "imagesubtractor"
+    )
+
+
+def pair_keys(imagestack: Imagestack, start: int, end: int, step: int) -> List[bytes]:
+    frames = []
+    for i in range(start, end + 1, step):
+        f = imagestack.imagelist[i]
+        st = f.stat()
+        frames.append(f"{f.name}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return [
+        hashlib.sha1(f1 + b";" + f2).hexdigest().encode()
+        for f1, f2 in zip(frames[:-1], frames[1:])
+    ]
+
+
+class CachedRun:
+    """the cached pairs of one run and the writer of the new ones"""
+
+    def __init__(self, directory: Path, keys: List[bytes], roinum: int):
+        self.directory = directory
+        self.keys = keys
+        self.record = np.dtype([("key", "S40"), ("areas", "<u4", (roinum,))])
+        stored: Dict[bytes, np.ndarray] = {}
+        for path in sorted(directory.glob("pairs.*.bin")):
+            count = path.stat().st_size // self.record.itemsize
+            recs = np.fromfile(path, dtype=self.record, count=count)
+            stored.update(zip(recs["key"].tolist(), recs["areas"]))
+        self.hits: Dict[int, np.ndarray] = {
+            num: stored[key] for num, key in enumerate(keys) if key in stored
+        }
+        self.file = None
+
+    def put(self, num: int, areadata: np.ndarray):
+        if num in self.hits:
+            return
+        if self.file is None:
+            path = self.directory.joinpath(f"pairs.{os.getpid()}.bin")
+            self.file = open(path, mode="ab")
+        rec = np.zeros(1, dtype=self.record)
+        rec["key"], rec["areas"] = self.keys[num], areadata
+        self.file.write(rec.tobytes())
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class ResultCache:
+    def __init__(
+        self,
+        directory: Union[str, Path, None] = None,
+        max_bytes: int = 2 * 1024**3,
+    ):
+        self.directory = Path(directory) if directory else default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def run_key(
+        self, roicollection: RoiCollection, subtractor: Subtractor, ksize: int = 5
+    ) -> str:
+        params = dict(
+            rois=roicollection.roidict["rois"],
+            threshold=subtractor.threshold,
+            normalized=subtractor.normalized,
+            ksize=ksize,
+        )
+        return hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def open(
+        self,
+        imagestack: Imagestack,
+        roicollection: RoiCollection,
+        subtractor: Subtractor,
+        start: int,
+        end: int,
+        step: int,
+    ) -> CachedRun:
+        directory = self.directory.joinpath(self.run_key(roicollection, subtractor))
+        directory.mkdir(parents=True, exist_ok=True)
+        # the mtime of the directory orders the eviction
+        os.utime(directory)
+        self.evict(keep=directory)
+        return CachedRun(
+            directory, pair_keys(imagestack, start, end, step), len(roicollection)
+        )
+
+    def size(self, directory: Path) -> int:
+        return sum(f.stat().st_size for f in directory.glob("pairs.*.bin"))
+
+    def evict(self, keep: Optional[Path] = None):
+        """remove the least recently used runs beyond `max_bytes`"""
+        runs = sorted(
+            (d for d in self.directory.iterdir() if d.is_dir()),
+            key=lambda d: d.stat().st_mtime,
+        )
+        sizes = {d: self.size(d) for d in runs}
+        total = sum(sizes.values())
+        for d in runs:
+            if total <= self.max_bytes:
+                break
+            if d == keep:
+                continue
+            shutil.rmtree(d, ignore_errors=True)
+            total -= sizes[d]
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,71 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from ..utils import load_json
+from .areawriter import checkpoint_path
+from .imagestack import Imagestack
+from .roicollection import RoiCollection
+
+__all__ = ["ResumeError", "run_params", "find_resume"]
+
+
+class ResumeError(ValueError):
+    """a partial Area.csv exists but cannot be resumed safely"""
+
+
+def roi_hash(roicollection: RoiCollection) -> str:
+    rois = json.dumps(roicollection.roidict["rois"], sort_keys=True)
+    return hashlib.sha1(rois.encode()).hexdigest()
+
+
+def run_params(
+    imagestack: Imagestack,
+    roicollection: RoiCollection,
+    threshold: float,
+    normalized: bool,
+    start: int,
+    end: int,
+    step: int,
+) -> Dict[str, Any]:
+    """parameters recorded in the checkpoint and compared on resume"""
+    return dict(
+        threshold=threshold,
+        normalized=normalized,
+        start=start,
+        end=end,
+        step=step,
+        roi=roi_hash(roicollection),
+        folder=imagestack.fingerprint(start, end, step),
+    )
+
+
+def find_resume(
+    outputfile: Union[str, Path], params: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """checkpoint record of an unfinished run with the same parameters.
+
+    Returns None when there is nothing to resume, or when the parameters
+    were changed on purpose (the run starts over). Raises ResumeError when
+    the images changed under the partial results.
+    """
+    outputfile = Path(outputfile)
+    checkpoint = checkpoint_path(outputfile)
+    if not outputfile.is_file() or not checkpoint.is_file():
+        return None
+    record = load_json(checkpoint)
+    if not record or record.get("complete") or not record.get("rows"):
+        return None
+    old = record.get("params") or {}
+    keys = ("threshold", "normalized", "start", "end", "step", "roi")
+    if any(old.get(k) != params.get(k) for k in keys):
+        return None
+    if old.get("folder") != params.get("folder"):
+        raise ResumeError(
+            f"The images in {outputfile.parent} changed since Area.csv was "
+            "checkpointed, remove Area.csv to start over"
+        )
+    if outputfile.stat().st_size < record.get("bytes", 0):
+        raise ResumeError(f"{outputfile} is shorter than its checkpoint")
+    return record
@@ -7,7 +7,18 @@ import numpy as np
 from ..utils import load_json
 from .roi import Roi
 
-__all__ = ["RoiCollection"]
+__all__ = ["RoiCollection", "is_roi_json"]
+
+# json sidecars of Area.csv, written into the image folder
+SIDECAR_SUFFIXES = (".meta.json",)
+
+
+def is_roi_json(name: str) -> bool:
+    return (
+        name.endswith(".json")
+        and not name.startswith(".")
+        and not name.endswith(SIDECAR_SUFFIXES)
+    )
 
 
 class RoiCollection(UserList):
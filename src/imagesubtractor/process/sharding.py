@@ -0,0 +1,276 @@
+"""Split one folder into frame-range shards processed by several nodes.
+
+All state lives in a shard directory on a filesystem shared by the nodes:
+
+    plan.json          folder, parameters and the shard list
+    Roi.json           roi collection used by every node
+    shard_00000.lock   claim (node id) of a node, its mtime is the heartbeat
+    shard_00000.npy    partial area matrix (pairs x rois) of a finished shard
+
+Neighbouring shards share their boundary frame, so the merged matrix is the
+same as the one of a single run. A shard whose lock is not refreshed within
+the heartbeat timeout is released by the coordinator and claimed again.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+from ..utils import dump_json, load_json
+from .areaformats import area_metadata, check_formats, write_area_matrix
+from .areawriter import write_area_csv
+from .imagestack import Imagestack
+from .parallel_subtractor import PoolSubtractor
+from .preview import PreviewPolicy
+from .roicollection import RoiCollection
+from .workerconfig import WorkerConfig
+
+__all__ = ["Shard", "ShardCoordinator", "ShardNode"]
+
+
+class Shard(NamedTuple):
+    index: int
+    num: int  # index of the first pair in the whole run
+    start: int  # first frame
+    end: int  # last frame (inclusive), first frame of the next shard
+    npairs: int
+
+    @property
+    def name(self) -> str:
+        return f"shard_{self.index:05}"
+
+
+def load_plan(shard_dir: Path) -> Dict:
+    plan = load_json(os.fspath(Path(shard_dir).joinpath("plan.json")))
+    if plan is None:
+        raise FileNotFoundError(f"No shard plan in {shard_dir}")
+    plan["shards"] = [Shard(**s) for s in plan["shards"]]
+    return plan
+
+
+class ShardCoordinator:
+    def __init__(self, shard_dir: Union[str, Path], heartbeat_timeout: float = 60.0):
+        self.shard_dir = Path(shard_dir)
+        self.heartbeat_timeout = heartbeat_timeout
+
+    def plan(
+        self,
+        folder: Union[str, Path],
+        roicollection: RoiCollection,
+        threshold: float,
+        normalized: bool,
+        start: int,
+        end: int,
+        step: int,
+        nshards: int,
+    ) -> List[Shard]:
+        frames = range(start, end + 1, step)
+        processnum = max(len(frames) - 1, 0)
+        nshards = max(min(nshards, processnum), 1)
+        bounds = np.linspace(0, processnum, nshards + 1).round().astype(int)
+        shards = [
+            Shard(i, int(a), frames[a], frames[b], int(b - a))
+            for i, (a, b) in enumerate(zip(bounds[:-1], bounds[1:]))
+            if b > a
+        ]
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        dump_json(self.shard_dir.joinpath("Roi.json"), roicollection.roidict)
+        dump_json(
+            self.shard_dir.joinpath("plan.json"),
+            dict(
+                folder=os.fspath(Path(folder).resolve()),
+                threshold=threshold,
+                normalized=normalized,
+                step=step,
+                processnum=processnum,
+                roinum=len(roicollection),
+                shards=[s._asdict() for s in shards],
+                meta=area_metadata(
+                    Imagestack().set_folder(folder),
+                    roicollection,
+                    start,
+                    end,
+                    step,
+                    dict(threshold=threshold, normalized=normalized),
+                ),
+            ),
+        )
+        return shards
+
+    def path(self, shard: Shard, suffix: str) -> Path:
+        return self.shard_dir.joinpath(shard.name + suffix)
+
+    def requeue_stale(self, shards: List[Shard]) -> List[Shard]:
+        """release the shards whose node stopped sending heartbeats"""
+        stale = []
+        now = time.time()
+        for shard in shards:
+            lock = self.path(shard, ".lock")
+            if self.path(shard, ".npy").exists():
+                continue
+            try:
+                if now - lock.stat().st_mtime > self.heartbeat_timeout:
+                    lock.unlink()
+                    stale.append(shard)
+            except FileNotFoundError:
+                pass
+        return stale
+
+    def wait(self, poll: float = 5.0) -> Dict:
+        plan = load_plan(self.shard_dir)
+        shards = plan["shards"]
+        while True:
+            done = [s for s in shards if self.path(s, ".npy").exists()]
+            if len(done) == len(shards):
+                return plan
+            for shard in self.requeue_stale(shards):
+                print(f"[SYSTEM] {shard.name} lost its node and was re-queued")
+            print(f"\r[SYSTEM] shards done: {len(done)}/{len(shards)}", end="")
+            time.sleep(poll)
+
+    def merge(self, plan: Optional[Dict] = None) -> np.ndarray:
+        plan = plan or load_plan(self.shard_dir)
+        outputarr = np.zeros((plan["processnum"], plan["roinum"]), dtype="u4")
+        for shard in plan["shards"]:
+            part = np.load(self.path(shard, ".npy"))
+            outputarr[shard.num : shard.num + shard.npairs] = part
+        return outputarr
+
+    def run(self, poll: float = 5.0, formats: Sequence[str] = ("csv",)) -> Path:
+        """wait for every shard and write the merged Area.csv"""
+        binary = check_formats(formats)
+        plan = self.wait(poll)
+        outputfile = Path(plan["folder"]).joinpath("Area.csv")
+        outputarr = self.merge(plan)
+        write_area_csv(outputfile, outputarr)
+        for fmt in binary:
+            write_area_matrix(outputfile, outputarr, fmt, plan.get("meta"))
+        print(f"\n[SYSTEM] Area.csv was saved at {outputfile.parent}")
+        return outputfile
+
+
+class ShardNode:
+    def __init__(
+        self,
+        shard_dir: Union[str, Path],
+        config: WorkerConfig = WorkerConfig(),
+        node_id: Optional[str] = None,
+        heartbeat: float = 10.0,
+    ):
+        self.shard_dir = Path(shard_dir)
+        self.config = config
+        self.node_id = node_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat = heartbeat
+        self.plan = load_plan(self.shard_dir)
+        self.coordinator = ShardCoordinator(self.shard_dir)
+        self.imagestack: Optional[Imagestack] = None
+        self.roicol = RoiCollection.from_json(self.shard_dir.joinpath("Roi.json"))
+
+    def claim(self) -> Optional[Shard]:
+        for shard in self.plan["shards"]:
+            if self.coordinator.path(shard, ".npy").exists():
+                continue
+            lock = self.coordinator.path(shard, ".lock")
+            try:
+                fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                continue
+            with os.fdopen(fd, "w") as file:
+                json.dump({"node": self.node_id, "time": time.time()}, file)
+            return shard
+        return None
+
+    def owns(self, lock: Path) -> bool:
+        """the lock still holds the claim of this node"""
+        try:
+            with open(lock) as file:
+                return json.load(file).get("node") == self.node_id
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def beat(self, lock: Path, stop: threading.Event):
+        while not stop.wait(self.heartbeat):
+            # re-queued by the coordinator and maybe claimed by another node,
+            # the result is still written
+            if not self.owns(lock):
+                return
+            try:
+                os.utime(lock)
+            except FileNotFoundError:
+                return
+
+    def process(self, shard: Shard) -> np.ndarray:
+        if self.imagestack is None:
+            self.imagestack = Imagestack().set_folder(self.plan["folder"])
+        processnum, tasks = self.imagestack.create_list_tasks(
+            shard.start, shard.end, self.plan["step"]
+        )
+        subtractors = PoolSubtractor(
+            self.config.num_workers,
+            cv_threads=self.config.cv_threads,
+            affinity=self.config.affinity,
+        ).setup_pool(
+            processnum=processnum,
+            tasks=tasks,
+            roicollection=self.roicol,
+            threshold=self.plan["threshold"],
+            normalized=self.plan["normalized"],
+            preview=PreviewPolicy.areas_only(),
+        )
+        outputarr = np.zeros((processnum, len(self.roicol)), dtype="u4")
+        subtractors.start()
+        while True:
+            i, _, areadata = subtractors.retrieve()
+            if i is None:
+                break
+            outputarr[i] = areadata
+        subtractors.join()
+        return outputarr
+
+    def run(self, poll: float = 5.0) -> int:
+        """process shards until every shard of the plan has a result"""
+        count = 0
+        while True:
+            shard = self.claim()
+            if shard is None:
+                pending = [
+                    s
+                    for s in self.plan["shards"]
+                    if not self.coordinator.path(s, ".npy").exists()
+                ]
+                if not pending:
+                    return count
+                # other nodes are on it, wait in case one of them dies
+                time.sleep(poll)
+                continue
+
+            lock = self.coordinator.path(shard, ".lock")
+            stop = threading.Event()
+            heart = threading.Thread(target=self.beat, args=(lock, stop), daemon=True)
+            heart.start()
+            try:
+                t1 = time.perf_counter()
+                outputarr = self.process(shard)
+                result = self.coordinator.path(shard, ".npy")
+                tmpfile = result.with_name(f"{shard.name}.{os.getpid()}.tmp.npy")
+                np.save(tmpfile, outputarr)
+                os.replace(tmpfile, result)
+                elapse = time.perf_counter() - t1
+                print(
+                    f"[SYSTEM] {self.node_id} finished {shard.name} "
+                    f"({shard.npairs / max(elapse, 1e-9):.1f} pairs/s)"
+                )
+                count += 1
+            finally:
+                stop.set()
+                heart.join()
+                if self.owns(lock):
+                    try:
+                        lock.unlink()
+                    except FileNotFoundError:
+                        pass
@@ -17,11 +17,14 @@ class Subtractor:
             raise ValueError(
                 "Only position 0(first) or 1(second) can be set for subtractor"
             )
+        self.data[str(position)] = self.to_float(img)
+        return self
+
+    def to_float(self, img: np.ndarray) -> np.ndarray:
         imgf32 = img.astype(np.float32)
         if self.normalized:
             imgf32 = (imgf32 - np.mean(imgf32)) / np.std(imgf32)
-        self.data[str(position)] = imgf32
-        return self
+        return imgf32
 
     def remove_results(self):
         self.data.pop("subtract", None)
@@ -34,17 +37,20 @@ class Subtractor:
         if not isinstance(im1, np.ndarray) or not isinstance(im2, np.ndarray):
             raise TypeError(f"images are not properly set. {(im1, im2)}")
 
+        self.data["subtract"] = self.subtract_float(im1, im2, sdrange)
+        return self
+
+    def subtract_float(
+        self, im1: np.ndarray, im2: np.ndarray, sdrange=10
+    ) -> np.ndarray:
         subtimgf32 = im1 - im2
         if self.normalized:
-            sub_img = self.convertfloatTo8bit(subtimgf32, -2.5, 2.5)
-        else:
-            mu = np.mean(subtimgf32)
-            sd = np.std(subtimgf32)
-            vmax = sd * sdrange
-            vmin = vmax * (-1)
-            sub_img = self.convertfloatTo8bit(subtimgf32 - mu, vmin, vmax)
-        self.data["subtract"] = sub_img
-        return self
+            return self.convertfloatTo8bit(subtimgf32, -2.5, 2.5)
+        mu = np.mean(subtimgf32)
+        sd = np.std(subtimgf32)
+        vmax = sd * sdrange
+        vmin = vmax * (-1)
+        return self.convertfloatTo8bit(subtimgf32 - mu, vmin, vmax)
 
     def median_blur(self, ksize=5) -> "Subtractor":
         sub_img = self.data.get("subtract", None)
@@ -58,6 +64,10 @@ class Subtractor:
         if blur is None:
             raise ValueError("Subtractor.subtract must be run before median_blur")
 
+        self.data["binary"] = self.binarize(blur)
+        return self
+
+    def binarize(self, blur: np.ndarray) -> np.ndarray:
         threshold = max(127 - self.threshold * 12.8, 0)
         _, binary = cv2.threshold(
             blur,
@@ -65,9 +75,21 @@ class Subtractor:
             1,
             cv2.THRESH_BINARY_INV,
         )
-        self.data["binary"] = binary
+        return binary
 
-        return self
+    def compute(
+        self, img1: np.ndarray, img2: np.ndarray, ksize=5
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """stateless version of the set_image/subtract/median_blur/
+        threshold_binarize chain. It does not touch `data`, so one instance
+        can be shared between threads.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: subtract, blur, binary
+        """
+        sub_img = self.subtract_float(self.to_float(img1), self.to_float(img2))
+        blur = cv2.medianBlur(sub_img, ksize)
+        return sub_img, blur, self.binarize(blur)
 
     def get_results(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
         """retrieve the results
@@ -0,0 +1,94 @@
+import multiprocessing as mp
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from .workerconfig import WorkerConfig, init_pool_worker
+
+__all__ = ["WarmPool", "PoolJob"]
+
+# params of the last jobs seen by this worker process, several jobs may be
+# interleaved by the batch scheduler.
+_job_cache: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+_JOB_CACHE_SIZE = 4
+
+
+class PoolJob(NamedTuple):
+    """Small picklable handle to the parameters of a job.
+
+    The parameters (roi collection, subtractor...) are written once to
+    `path`, every worker loads them on its first task of the job, so each
+    task only carries this handle instead of a pickled copy of the job.
+    """
+
+    job_id: int
+    path: str
+    func: Callable
+
+    def __call__(self, task):
+        params = _job_cache.get(self.job_id)
+        if params is None:
+            with open(self.path, "rb") as file:
+                params = pickle.load(file)
+            _job_cache[self.job_id] = params
+            while len(_job_cache) > _JOB_CACHE_SIZE:
+                _job_cache.popitem(last=False)
+        return self.func(task, **params)
+
+
+class WarmPool:
+    """process pool that stays alive between runs.
+
+    The pool is started lazily at the first run and restarted only when the
+    worker configuration changes. `shutdown` must be called on exit.
+    """
+
+    def __init__(self):
+        self.config: Optional[WorkerConfig] = None
+        self.pool = None
+        self.jobdir = tempfile.mkdtemp(prefix="imagesubtractor-")
+        self.job_id = 0
+        self.lock = threading.Lock()
+
+    def get(self, config: WorkerConfig):
+        with self.lock:
+            if self.pool is not None and config != self.config:
+                self._close()
+            if self.pool is None:
+                self.config = config
+                self.pool = mp.Pool(
+                    config.num_workers,
+                    initializer=init_pool_worker,
+                    initargs=(config.cv_threads, config.cpu_queue()),
+                )
+            return self.pool
+
+    def bind(self, func: Callable, **params: Dict[str, Any]) -> PoolJob:
+        with self.lock:
+            self.job_id += 1
+            path = os.path.join(self.jobdir, f"job_{self.job_id}.pkl")
+            with open(path, "wb") as file:
+                pickle.dump(params, file, protocol=pickle.HIGHEST_PROTOCOL)
+            return PoolJob(self.job_id, path, func)
+
+    def release(self, job: PoolJob):
+        try:
+            os.remove(job.path)
+        except OSError:
+            pass
+
+    def _close(self):
+        # not terminated, the workers flush their image writers on exit
+        self.pool.close()
+        self.pool.join()
+        self.pool = None
+
+    def shutdown(self):
+        with self.lock:
+            if self.pool is not None:
+                self._close()
+            shutil.rmtree(self.jobdir, ignore_errors=True)
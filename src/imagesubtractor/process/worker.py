@@ -1,14 +1,18 @@
 import multiprocessing as mp
-import os
 from pathlib import Path
+from typing import Optional, Tuple, Union
 
 import cv2
+import numpy as np
 
-from .queue_item import Result, Task
+from .imagewriter import SaveOptions, image_writer
+from .preview import PreviewPolicy
+from .queue_item import ChunkResult, Result, Task, TaskChunk
 from .roicollection import RoiCollection
 from .subtractor import Subtractor
+from .workerconfig import init_worker
 
-__all__ = ["SubtractorWorker", "subtract_worker_func"]
+__all__ = ["SubtractorWorker", "subtract_worker_func", "subtract_chunk_func"]
 
 
 class SubtractorWorker(mp.Process):
@@ -18,7 +22,10 @@ class SubtractorWorker(mp.Process):
         output: mp.Queue,
         roicollection: RoiCollection,
         subtractor: Subtractor,
-        saveflag: bool = False,
+        saveflag: Union[bool, SaveOptions] = False,
+        preview: PreviewPolicy = PreviewPolicy(),
+        cv_threads: int = 1,
+        cpus: Optional[Tuple[int, ...]] = None,
     ):
         super().__init__(daemon=True)
         self.task = task
@@ -26,27 +33,30 @@ class SubtractorWorker(mp.Process):
         self.roicol = roicollection
         self.subtractor = subtractor
         self.saveflag = saveflag
+        self.preview = preview
+        self.cv_threads = cv_threads
+        self.cpus = cpus
 
     def run(self):
+        init_worker(self.cv_threads, self.cpus)
         while not self.task.empty():
-            num, p1, p2 = self.task.get()
-            if num is None:
+            task = self.task.get()
+            if task.num is None:
                 break
-            subtract, blur, binary = (
-                self.subtractor.set_image(cv2.imread(p1), 0)  # img1
-                .set_image(cv2.imread(p2), 1)  # img2
-                .subtract()  # img2 -img1 -> subtract
-                .median_blur(ksize=5)  # subtract -> blur
-                .threshold_binarize()  # blur -> binary
-                .get_results()  # retrieve subtract, blur, binary
+            func = (
+                subtract_chunk_func
+                if isinstance(task, TaskChunk)
+                else subtract_worker_func
+            )
+            self.output.put(
+                func(
+                    task,
+                    self.roicol,
+                    self.subtractor,
+                    saveflag=self.saveflag,
+                    preview=self.preview,
+                )
             )
-            if self.saveflag:
-                filepath = Path(p1).parent.joinpath(f"{num:0>6}_sub.tif")
-                cv2.imwrite(os.fspath(filepath), blur)
-                print("saved in", filepath)
-
-            areadata = self.roicol.measureareas(binary)
-            self.output.put(Result(num, subtract, areadata))
 
 
 def subtract_worker_func(
@@ -54,22 +64,58 @@ def subtract_worker_func(
     roicollection: RoiCollection,
     subtractor: Subtractor,
     saveflag: bool = False,
+    preview: PreviewPolicy = PreviewPolicy(),
 ):
     num, p1, p2 = task
     if num is None:
         return
-    subtract, blur, binary = (
-        subtractor.set_image(cv2.imread(p1), 0)  # img1
-        .set_image(cv2.imread(p2), 1)  # img2
-        .subtract()  # img2 -img1 -> subtract
-        .median_blur(ksize=5)  # subtract -> blur
-        .threshold_binarize()  # blur -> binary
-        .get_results()  # retrieve subtract, blur, binary
+    # img1 - img2 -> subtract -> blur -> binary
+    subtract, blur, binary = subtractor.compute(
+        cv2.imread(p1), cv2.imread(p2), ksize=5
     )
     if saveflag:
-        filepath = Path(p1).parent.joinpath(f"{num:0>6}_sub.tif")
-        cv2.imwrite(os.fspath(filepath), blur)
-        print("saved in", filepath)
+        save_frame(p1, num, saveflag, subtract, blur, binary)
 
     areadata = roicollection.measureareas(binary)
-    return Result(num, subtract, areadata)
+    # only ship the image back when someone is going to look at it
+    return Result(num, subtract if preview.want(num) else None, areadata)
+
+
+def subtract_chunk_func(
+    chunk: TaskChunk,
+    roicollection: RoiCollection,
+    subtractor: Subtractor,
+    saveflag: bool = False,
+    preview: PreviewPolicy = PreviewPolicy(),
+) -> ChunkResult:
+    if chunk.num is None:
+        return
+    areas = np.zeros((chunk.npairs, len(roicollection)), dtype="u4")
+    images = []
+    # every frame is decoded once, the second image of a pair is the first
+    # image of the next one.
+    img1 = cv2.imread(chunk.files[0])
+    for k, (p1, p2) in enumerate(zip(chunk.files[:-1], chunk.files[1:])):
+        num = chunk.num + k
+        img2 = cv2.imread(p2)
+        subtract, blur, binary = subtractor.compute(img1, img2, ksize=5)
+        if saveflag:
+            save_frame(p1, num, saveflag, subtract, blur, binary)
+        areas[k] = roicollection.measureareas(binary)
+        images.append(subtract if preview.want(num) else None)
+        img1 = img2
+    return ChunkResult(chunk.num, tuple(images), areas)
+
+
+def save_frame(
+    p1: str,
+    num: int,
+    saveflag: Union[bool, SaveOptions],
+    subtract: np.ndarray,
+    blur: np.ndarray,
+    binary: np.ndarray,
+):
+    # queued to the writer thread of this process, see imagewriter
+    options = SaveOptions.from_flag(saveflag)
+    img = dict(subtract=subtract, blur=blur, binary=binary)[options.image]
+    image_writer(options).put(options.output_folder(Path(p1).parent), num, img)
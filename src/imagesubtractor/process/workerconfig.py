@@ -0,0 +1,126 @@
+import multiprocessing as mp
+import os
+import queue
+import time
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+
+from .queue_item import Task
+from .roicollection import RoiCollection
+from .subtractor import Subtractor
+
+__all__ = ["WorkerConfig", "available_cpus", "calibrate_workers"]
+
+
+def available_cpus() -> List[int]:
+    """cpus this process may run on (respects taskset/cgroup affinity)"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class WorkerConfig(NamedTuple):
+    """num_workers processes, each using cv_threads OpenCV threads.
+
+    With affinity, every worker is pinned to its own cv_threads cpus.
+    """
+
+    num_workers: int = max(len(available_cpus()) - 1, 1)
+    cv_threads: int = 1
+    affinity: bool = False
+
+    def cpu_sets(self) -> List[Optional[Tuple[int, ...]]]:
+        if not self.affinity or not hasattr(os, "sched_setaffinity"):
+            return [None] * self.num_workers
+        cpus = available_cpus()
+        size = max(self.cv_threads, 1)
+        return [
+            tuple(cpus[(i * size + k) % len(cpus)] for k in range(size))
+            for i in range(self.num_workers)
+        ]
+
+    def cpu_queue(self) -> Optional[mp.Queue]:
+        """cpu sets handed out to pool workers by `init_pool_worker`"""
+        if not self.affinity:
+            return None
+        cpu_queue = mp.Queue()
+        for cpus in self.cpu_sets():
+            cpu_queue.put(cpus)
+        return cpu_queue
+
+
+def init_worker(cv_threads: int = 1, cpus: Optional[Sequence[int]] = None):
+    if cv_threads > 0:
+        cv2.setNumThreads(cv_threads)
+    if cpus and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            print(f"[ERROR] cannot set cpu affinity {cpus}: {e}")
+
+
+def init_pool_worker(cv_threads: int = 1, cpu_queue: Optional[mp.Queue] = None):
+    cpus = None
+    if cpu_queue is not None:
+        try:
+            cpus = cpu_queue.get(timeout=1)
+        except queue.Empty:
+            pass
+    init_worker(cv_threads, cpus)
+
+
+def _bench_pair(task: Task, roicollection: RoiCollection, subtractor: Subtractor):
+    _, _, binary = subtractor.compute(cv2.imread(task.file1), cv2.imread(task.file2))
+    return roicollection.measureareas(binary)
+
+
+def candidate_configs(ncpu: Optional[int] = None) -> List[WorkerConfig]:
+    """worker x opencv thread combinations that fit in `ncpu` cores"""
+    ncpu = ncpu or len(available_cpus())
+    configs = []
+    for cv_threads in (1, 2, 4):
+        num_workers = ncpu // cv_threads
+        if num_workers < 1:
+            continue
+        configs.append(WorkerConfig(num_workers, cv_threads))
+    return configs
+
+
+def calibrate_workers(
+    tasks: Sequence[Task],
+    roicollection: RoiCollection,
+    subtractor: Subtractor,
+    configs: Optional[Sequence[WorkerConfig]] = None,
+    affinity: bool = False,
+) -> WorkerConfig:
+    """run `tasks` (a few pairs) with every config and return the fastest.
+
+    Pool start-up is excluded from the timing, only the throughput of
+    warm workers is compared.
+    """
+    configs = list(configs or candidate_configs())
+    best, best_rate = configs[0]._replace(affinity=affinity), 0.0
+    for config in configs:
+        config = config._replace(affinity=affinity)
+        sample = list(tasks)[: max(2 * config.num_workers, 8)]
+        with mp.Pool(
+            config.num_workers,
+            initializer=init_pool_worker,
+            initargs=(config.cv_threads, config.cpu_queue()),
+        ) as pool:
+            # make sure every worker is up before measuring
+            pool.map(time.sleep, [0.0] * config.num_workers)
+            t1 = time.perf_counter()
+            pool.starmap(
+                _bench_pair,
+                ((t, roicollection, subtractor) for t in sample),
+            )
+            rate = len(sample) / (time.perf_counter() - t1)
+        print(
+            f"[SYSTEM] workers: {config.num_workers}, "
+            f"cv threads: {config.cv_threads}, {rate:.1f} pairs/s"
+        )
+        if rate > best_rate:
+            best, best_rate = config, rate
+    return best
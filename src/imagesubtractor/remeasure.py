@@ -0,0 +1,74 @@
+"""Measure a new roi collection on the masks archived by a previous run.
+
+    imagesubtractor-batch /data/exp1 --save --save-format mask
+    imagesubtractor-remeasure /data/exp1_derived --roi /data/exp1/Roi_new.json
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .process import (
+    AREA_FORMATS,
+    MaskArchive,
+    RoiCollection,
+    write_area_csv,
+    write_area_matrix,
+)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="imagesubtractor-remeasure", description=__doc__
+    )
+    parser.add_argument("archive", type=Path, help="folder of the mask archive")
+    parser.add_argument("--roi", type=Path, required=True, help="roi json file")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="output csv (default: Area_remeasured.csv in the archive folder)",
+    )
+    parser.add_argument(
+        "--format", nargs="+", choices=AREA_FORMATS, default=["csv"], dest="formats"
+    )
+    parser.add_argument("--batch", type=int, default=64, help="masks per batch")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        archive = MaskArchive(args.archive)
+    except FileNotFoundError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    if not len(archive):
+        print(f"[ERROR] No masks in the archive at {args.archive}")
+        return 1
+    roicol = RoiCollection.from_json(args.roi)
+    t1 = time.perf_counter()
+    nums, areas = archive.remeasure(roicol, args.batch)
+    elapse = time.perf_counter() - t1
+    # pairs missing from the archive are zeros, like an unfinished run
+    outputarr = np.zeros((nums.max() + 1 if len(nums) else 0, len(roicol)), "u4")
+    outputarr[nums] = areas
+
+    outputfile = args.output or args.archive.joinpath("Area_remeasured.csv")
+    write_area_csv(outputfile, outputarr)
+    meta = dict(rois=[int(roi.order) for roi in roicol], archive=str(args.archive))
+    for fmt in AREA_FORMATS[1:]:
+        if fmt in args.formats:
+            write_area_matrix(outputfile, outputarr, fmt, meta)
+    print(
+        f"[SYSTEM] {len(nums)} masks remeasured in {elapse:.2f} s, "
+        f"saved at {outputfile}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
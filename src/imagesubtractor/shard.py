@@ -0,0 +1,108 @@
+"""Sharded processing of one folder by several nodes sharing a filesystem.
+
+    imagesubtractor-shard plan FOLDER SHARD_DIR --shards 16 [--wait]
+    imagesubtractor-shard node SHARD_DIR          # on every node
+    imagesubtractor-shard coordinate SHARD_DIR    # merge into Area.csv
+"""
+import argparse
+import sys
+from pathlib import Path
+from typing import Optional, Sequence
+
+from .batch import find_roi_json
+from .process import (
+    AREA_FORMATS,
+    Imagestack,
+    RoiCollection,
+    ShardCoordinator,
+    ShardNode,
+    WorkerConfig,
+    WorkerError,
+)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="imagesubtractor-shard", description=__doc__)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    plan = sub.add_parser("plan", help="split a folder into shards")
+    plan.add_argument("folder", type=Path)
+    plan.add_argument("shard_dir", type=Path)
+    plan.add_argument("--shards", type=int, required=True)
+    plan.add_argument("--roi", type=Path, default=None)
+    plan.add_argument("--threshold", type=float, default=2.0)
+    plan.add_argument("--normalized", action="store_true")
+    plan.add_argument("--step", type=int, default=1)
+    plan.add_argument("--start", type=int, default=0)
+    plan.add_argument("--end", type=int, default=-1)
+    plan.add_argument("--wait", action="store_true", help="coordinate after planning")
+    plan.add_argument("--timeout", type=float, default=60.0)
+    plan.add_argument(
+        "--format", nargs="+", choices=AREA_FORMATS, default=["csv"], dest="formats"
+    )
+
+    node = sub.add_parser("node", help="process shards of a plan")
+    node.add_argument("shard_dir", type=Path)
+    node.add_argument("--workers", type=int, default=None)
+    node.add_argument("--cv-threads", type=int, default=1)
+    node.add_argument("--affinity", action="store_true")
+    node.add_argument("--heartbeat", type=float, default=10.0)
+
+    coordinate = sub.add_parser("coordinate", help="re-queue dead shards and merge")
+    coordinate.add_argument("shard_dir", type=Path)
+    coordinate.add_argument("--timeout", type=float, default=60.0)
+    coordinate.add_argument("--poll", type=float, default=5.0)
+    coordinate.add_argument(
+        "--format",
+        nargs="+",
+        choices=AREA_FORMATS,
+        default=["csv"],
+        dest="formats",
+        help="Area.csv is always written, binary formats are written next to it",
+    )
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "plan":
+        folder = args.folder.resolve()
+        ims = Imagestack().set_folder(folder)
+        roijson = args.roi or find_roi_json(folder)
+        if len(ims) < 2 or roijson is None:
+            print(f"[ERROR] {folder} needs images and a roi json file")
+            return 1
+        last = len(ims) - 1
+        end = last if args.end < 0 else min(args.end, last)
+        coordinator = ShardCoordinator(args.shard_dir, args.timeout)
+        shards = coordinator.plan(
+            folder,
+            RoiCollection.from_json(roijson),
+            args.threshold,
+            args.normalized,
+            args.start,
+            end,
+            args.step,
+            args.shards,
+        )
+        print(f"[SYSTEM] {len(shards)} shards planned in {args.shard_dir}")
+        if args.wait:
+            coordinator.run(formats=args.formats)
+    elif args.command == "node":
+        config = WorkerConfig(
+            args.workers or WorkerConfig().num_workers, args.cv_threads, args.affinity
+        )
+        try:
+            count = ShardNode(args.shard_dir, config, heartbeat=args.heartbeat).run()
+        except WorkerError as e:
+            # the shard is left unclaimed for another node
+            print(f"[ERROR] {e}")
+            return 1
+        print(f"[SYSTEM] {count} shards processed")
+    else:
+        ShardCoordinator(args.shard_dir, args.timeout).run(args.poll, args.formats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
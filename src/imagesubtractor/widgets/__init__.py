@@ -1,11 +1,39 @@
-from .contrastwidget import ContrastWidget
-from .imageviewer import ImageViewer
-from .sliderviewer import SliderViewer
-from .sliderwithvalue import SliderWithValue
-
-__all__ = [
-    "ImageViewer",
-    "SliderWithValue",
-    "SliderViewer",
-    "ContrastWidget",
-]
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .activityplot import ActivityPlot
+    from .contrastwidget import ContrastWidget
+    from .folderloader import FolderListing, FolderLoader
+    from .imageviewer import ImageViewer
+    from .previewrenderer import PreviewRenderer, PreviewRequest
+    from .sliderviewer import SliderViewer
+    from .sliderwithvalue import SliderWithValue
+
+# imported from their submodule at first use, like the process package
+_EXPORTS = {
+    "ImageViewer": "imageviewer",
+    "SliderWithValue": "sliderwithvalue",
+    "SliderViewer": "sliderviewer",
+    "ContrastWidget": "contrastwidget",
+    "PreviewRenderer": "previewrenderer",
+    "PreviewRequest": "previewrenderer",
+    "ActivityPlot": "activityplot",
+    "FolderLoader": "folderloader",
+    "FolderListing": "folderloader",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,84 @@
+from typing import Optional
+
+import cv2
+import numpy as np
+from PySide2 import QtCore, QtWidgets
+
+from ..process import ActivityBuffer
+from .imageviewer import ImageViewer
+
+
+class ActivityPlot(QtWidgets.QWidget):
+    """area of every roi over the run, as stacked traces or a heatmap.
+
+    The plot is drawn from the snapshot of an ActivityBuffer into an image
+    of a fixed size, so a redraw costs the same at any point of the run.
+    """
+
+    modes = ("heatmap", "traces")
+
+    def __init__(self, parent=None, width: int = 480, height: int = 160):
+        super().__init__(parent=parent)
+        self.plotsize = (width, height)
+        self.buffer: Optional[ActivityBuffer] = None
+
+        self.mode = QtWidgets.QComboBox(self)
+        self.mode.addItems(self.modes)
+        self.mode.currentIndexChanged.connect(self.redraw)
+        self.label = QtWidgets.QLabel("Activity", self)
+        self.canvas = ImageViewer(self)
+
+        layout = QtWidgets.QGridLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.label, 0, 0, 1, 1, QtCore.Qt.AlignLeft)
+        layout.addWidget(self.mode, 0, 1, 1, 1, QtCore.Qt.AlignRight)
+        layout.addWidget(self.canvas, 1, 0, 1, 2)
+
+    def set_buffer(self, buffer: Optional[ActivityBuffer]):
+        self.buffer = buffer
+        self.redraw()
+
+    def redraw(self):
+        if self.buffer is None:
+            return
+        frames, means = self.buffer.snapshot()
+        if self.mode.currentText() == "heatmap":
+            img = self.draw_heatmap(means)
+        else:
+            img = self.draw_traces(means)
+        if len(frames):
+            self.label.setText(f"Activity: pairs {frames[0]} - {frames[-1]}")
+        self.canvas.render_image(img, self.canvas.width(), self.canvas.height(), False)
+
+    def normalize(self, means: np.ndarray) -> np.ndarray:
+        # each roi on its own scale, the pending bins are 0
+        peak = np.nan_to_num(np.fmax.reduce(means, axis=0), nan=0.0)
+        norm = means / np.where(peak > 0, peak, 1)
+        return np.nan_to_num(norm, nan=0.0)
+
+    def draw_heatmap(self, means: np.ndarray) -> np.ndarray:
+        width, height = self.plotsize
+        if not means.size:
+            return np.zeros((height, width, 3), dtype=np.uint8)
+        # rois x bins, the run fills the ring from the left like the traces
+        cells = np.zeros((means.shape[1], self.buffer.capacity), dtype=np.uint8)
+        cells[:, : len(means)] = self.normalize(means).T * 255
+        cells = cv2.resize(cells, (width, height), interpolation=cv2.INTER_NEAREST)
+        return cv2.applyColorMap(cells, cv2.COLORMAP_VIRIDIS)
+
+    def draw_traces(self, means: np.ndarray) -> np.ndarray:
+        width, height = self.plotsize
+        img = np.zeros((height, width, 3), dtype=np.uint8)
+        if len(means) < 2 or not means.shape[1]:
+            return img
+        roinum = means.shape[1]
+        band = height / roinum
+        # the x axis is the whole ring, the run fills it from the left
+        x = np.arange(len(means)) * (width - 1) / max(self.buffer.capacity - 1, 1)
+        y = (np.arange(1, roinum + 1) * band)[:, None] - (
+            self.normalize(means).T * band * 0.9
+        )
+        traces = np.stack(np.broadcast_arrays(x[None, :], y), axis=2)
+        traces = list(traces.round().astype(np.int32))
+        cv2.polylines(img, traces, False, (153, 204, 255))
+        return img
@@ -0,0 +1,92 @@
+import os
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+from PySide2 import QtCore
+
+from ..process import Imagestack, is_roi_json
+
+
+class FolderListing(NamedTuple):
+    homedir: Path
+    # sorted image files found so far
+    imagelist: List[Path]
+    # (height, width) of the first image found
+    shape: Tuple[int, int]
+    roijsonfile: Optional[Path]
+    done: bool
+
+
+class FolderLoader(QtCore.QThread):
+    """list the images of a folder off the GUI thread.
+
+    `listed` is sent as soon as the first image is decoded, then at most
+    every `interval` seconds while the listing grows, and once with
+    `done=True`. `failed` is sent with a message when the folder cannot be
+    read or has no images. After `cancel` nothing more is sent.
+    """
+
+    listed = QtCore.Signal(object)
+    failed = QtCore.Signal(str)
+
+    def __init__(self, homedir, parent=None, interval: float = 0.2):
+        super().__init__(parent=parent)
+        self.homedir = Path(homedir)
+        self.interval = interval
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            self.scan()
+        except Exception as e:
+            if not self.cancelled:
+                self.failed.emit(f"[ERROR] {self.homedir} cannot be loaded: {e}")
+
+    def scan(self):
+        ims = Imagestack()
+        ims.homedir = self.homedir
+        found: List[Path] = []
+        jsonfiles: List[Path] = []
+        last = -float("inf")
+        with os.scandir(self.homedir) as entries:
+            for entry in entries:
+                if self.cancelled:
+                    return
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                if is_roi_json(entry.name):
+                    jsonfiles.append(Path(entry.path))
+                elif ims.is_image(entry.name):
+                    found.append(Path(entry.path))
+                    if ims.img_width is None:
+                        ims.add_images(found).set_size()
+                        found = []
+                        last = self.send(ims, False)
+                    elif time.monotonic() - last >= self.interval:
+                        ims.add_images(found)
+                        found = []
+                        last = self.send(ims, False)
+        if self.cancelled:
+            return
+        if not found and not ims.imagelist:
+            self.failed.emit("[SYSTEM] The directory does not have any jpg files")
+            return
+        ims.add_images(found)
+        self.send(ims, True, max(jsonfiles, key=lambda f: f.name, default=None))
+
+    def send(self, ims: Imagestack, done: bool, roijsonfile=None) -> float:
+        if not self.cancelled:
+            self.listed.emit(
+                FolderListing(
+                    ims.homedir,
+                    ims.imagelist,
+                    (ims.img_height, ims.img_width),
+                    roijsonfile,
+                    done,
+                )
+            )
+        return time.monotonic()
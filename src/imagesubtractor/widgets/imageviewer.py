@@ -1,18 +1,47 @@
+from typing import Optional
+
 import cv2
+import numpy as np
 from numpy import ndarray
 from PySide2 import QtCore, QtGui, QtWidgets
 
 
 class ImageViewer(QtWidgets.QGraphicsView):
+    """show numpy images without copying them into a new QImage.
+
+    One pixmap item is reused, colour images are converted into a reused
+    RGB buffer and grayscale images are shown as they are. The image is
+    scaled by the view transform, which is only updated when the image or
+    the window size changes.
+    """
+
     def __init__(self, parent=None):
         super().__init__(parent)
 
         self.data = None
-        self.pixel = QtGui.QPixmap()
+        self.buffer: Optional[ndarray] = None
+        self.fitted = None
         self.setScene(QtWidgets.QGraphicsScene(self))
+        self.item = QtWidgets.QGraphicsPixmapItem()
+        self.scene().addItem(self.item)
         self.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
         self.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
 
+    def to_qimage(self, src: ndarray) -> QtGui.QImage:
+        """wrap the pixels of `src` (or of the RGB buffer) in a QImage"""
+        if src.ndim == 2:
+            self.data = np.ascontiguousarray(src, dtype=np.uint8)
+            fmt = QtGui.QImage.Format_Grayscale8
+        elif src.ndim == 3:
+            if self.buffer is None or self.buffer.shape != src.shape:
+                self.buffer = np.empty(src.shape, dtype=np.uint8)
+            self.data = cv2.cvtColor(src, cv2.COLOR_BGR2RGB, dst=self.buffer)
+            fmt = QtGui.QImage.Format_RGB888
+        else:
+            raise TypeError("Image type error")
+        h, w = self.data.shape[:2]
+        return QtGui.QImage(self.data.data, w, h, self.data.strides[0], fmt)
+
     def render_image(
         self,
         src: ndarray,
@@ -20,36 +49,29 @@ class ImageViewer(QtWidgets.QGraphicsView):
         win_height: int = None,
         keep_aspect_ratio=True,
     ):
-        if src.ndim == 2:
-            img = cv2.cvtColor(src, cv2.COLOR_GRAY2RGB)
-        elif src.ndim == 3:
-            img = cv2.cvtColor(src, cv2.COLOR_BGR2RGB)
-        else:
-            raise TypeError("Image type error")
+        qimg = self.to_qimage(src)
+        self.render_qimage(qimg, win_width, win_height, keep_aspect_ratio)
 
-        h, w, _ = img.shape
-        self.data = img
+    def render_qimage(
+        self,
+        qimg: QtGui.QImage,
+        win_width: int = None,
+        win_height: int = None,
+        keep_aspect_ratio=True,
+    ):
+        w, h = qimg.width(), qimg.height()
         win_width = win_width if win_width is not None else w
         win_height = win_height if win_height is not None else h
-        keep_ratio = (
-            QtCore.Qt.KeepAspectRatio
-            if keep_aspect_ratio
-            else QtCore.Qt.IgnoreAspectRatio
-        )
-        qimg = QtGui.QImage(
-            self.data.data,
-            w,
-            h,
-            self.data.ndim * w,
-            QtGui.QImage.Format_RGB888,
-        ).scaled(
-            win_width,
-            win_height,
-            keep_ratio,
-        )
-        item = QtWidgets.QGraphicsPixmapItem(self.pixel.fromImageInPlace(qimg))
-        item.setPos(0, 0)
-        self.scene().clear()
-        self.scene().addItem(item)
-        self.scene().setSceneRect(0, 0, win_width, win_height)
+        # the pixmap is the only copy, the QImage may point to `self.data`
+        self.item.setPixmap(QtGui.QPixmap.fromImage(qimg))
+
+        fit = (w, h, win_width, win_height, keep_aspect_ratio)
+        if fit == self.fitted or not w or not h:
+            return
+        self.fitted = fit
+        sx, sy = win_width / w, win_height / h
+        if keep_aspect_ratio:
+            sx = sy = min(sx, sy)
+        self.setTransform(QtGui.QTransform.fromScale(sx, sy))
+        self.scene().setSceneRect(0, 0, w, h)
         self.resize(win_width, win_height)
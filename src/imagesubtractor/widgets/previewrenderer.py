@@ -0,0 +1,163 @@
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+from PySide2 import QtCore, QtGui
+
+from ..process import Contrast, Imagestack, RoiCollection, Subtractor
+
+
+class PreviewRequest(NamedTuple):
+    imagestack: Imagestack
+    frame: int
+    step: int
+    show_subtract: bool
+    threshold: float
+    normalized: bool
+    contrast: Contrast
+    roicollection: RoiCollection
+
+    @property
+    def frame_key(self) -> tuple:
+        # indices move while a folder is still listed, the length tells
+        return (self.imagestack.homedir, len(self.imagestack), self.frame)
+
+    @property
+    def base_key(self) -> tuple:
+        """everything but the rois that changes the preview"""
+        return (
+            *self.frame_key,
+            self.step if self.show_subtract else None,
+            self.show_subtract,
+            self.threshold if self.show_subtract else None,
+            self.normalized if self.show_subtract else None,
+            self.contrast.min,
+            self.contrast.max,
+        )
+
+    @property
+    def blur_key(self) -> tuple:
+        """what the blurred subtraction depends on, not the threshold"""
+        return (
+            *self.frame_key,
+            self.step,
+            self.normalized,
+            self.contrast.min,
+            self.contrast.max,
+        )
+
+
+class Superseded(Exception):
+    pass
+
+
+class PreviewRenderer(QtCore.QThread):
+    """render the preview of the main window off the GUI thread.
+
+    Only the latest request is kept: a request that was replaced while it
+    waited is dropped, and one replaced while it renders is abandoned at
+    the next stage. `rendered` sends (frame, QImage, histogram image, and
+    the pixel buffer of the QImage).
+    """
+
+    rendered = QtCore.Signal(object)
+    # blurred subtractions kept for threshold changes and nearby frames
+    cache_size = 32
+
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+        self.cond = threading.Condition()
+        self.request: Optional[PreviewRequest] = None
+        self.serial = 0
+        self.running = True
+        # the last frame before the rois were drawn, with its histogram
+        self.base: Optional[Tuple[tuple, np.ndarray, np.ndarray]] = None
+        # the last decoded frame, a new contrast range does not read it again
+        self.frame: Optional[Tuple[tuple, np.ndarray]] = None
+        self.blurs: "OrderedDict[tuple, Tuple[np.ndarray, np.ndarray]]" = (
+            OrderedDict()
+        )
+
+    def submit(self, request: PreviewRequest):
+        with self.cond:
+            self.serial += 1
+            self.request = request
+            self.cond.notify()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.wait()
+
+    def check(self, serial: int):
+        if serial != self.serial or not self.running:
+            raise Superseded
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running and self.request is None:
+                    self.cond.wait()
+                if not self.running:
+                    return
+                request, serial = self.request, self.serial
+                self.request = None
+            try:
+                result = self.render(request, serial)
+            except Superseded:
+                continue
+            except Exception as e:
+                print(f"[ERROR] preview: {e}")
+                continue
+            with self.cond:
+                if serial == self.serial:
+                    self.rendered.emit(result)
+
+    def render_base(self, request: PreviewRequest, serial: int):
+        subtractor = Subtractor(request.threshold, request.normalized)
+        if request.show_subtract and request.blur_key in self.blurs:
+            # only the threshold changed, or a frame seen a moment ago
+            self.blurs.move_to_end(request.blur_key)
+            blur, hist = self.blurs[request.blur_key]
+            return subtractor.binarize(blur).astype(np.uint8) * 255, hist
+
+        key = request.frame_key
+        if self.frame is None or self.frame[0] != key:
+            self.frame = (key, request.imagestack.read_image(request.frame))
+        img = self.frame[1]
+        hist = request.contrast.draw_histogram(img, key)
+        if request.contrast.adjusted:
+            img = request.contrast.draw_contrast(img)
+        if not request.show_subtract:
+            return img, hist
+        if request.frame < request.step:
+            return np.zeros_like(img, dtype=np.uint8), hist
+
+        pre = request.imagestack.read_image(request.frame - request.step)
+        self.check(serial)
+        sub_img = subtractor.subtract_float(
+            subtractor.to_float(pre), subtractor.to_float(img)
+        )
+        blur = cv2.medianBlur(sub_img, 5)
+        self.blurs[request.blur_key] = (blur, hist)
+        while len(self.blurs) > self.cache_size:
+            self.blurs.popitem(last=False)
+        return subtractor.binarize(blur).astype(np.uint8) * 255, hist
+
+    def render(self, request: PreviewRequest, serial: int):
+        key = request.base_key
+        if self.base is None or self.base[0] != key:
+            img, hist = self.render_base(request, serial)
+            self.base = (key, img, hist)
+        _, img, hist = self.base
+        self.check(serial)
+        img = request.roicollection.draw_rois(img.copy())
+        code = cv2.COLOR_BGR2RGB if img.ndim == 3 else cv2.COLOR_GRAY2RGB
+        rgb = cv2.cvtColor(img, code)
+        h, w = rgb.shape[:2]
+        # scaled by the view, the QImage points to `rgb`, which travels with it
+        qimg = QtGui.QImage(rgb.data, w, h, rgb.strides[0], QtGui.QImage.Format_RGB888)
+        return request.frame, qimg, hist, rgb
@@ -37,14 +37,13 @@ class QThreadWorker(QtCore.QThread):
                 if i is None:
                     break
                 cache[i] = img
-                if count in cache:
-                    self.process_result.emit(cache.pop(count))
+                while count in cache:
+                    img = cache.pop(count)
+                    # None is the end marker, skip frames sent without preview
+                    if img is not None:
+                        self.process_result.emit(img)
                     tbar.update()
                     count += 1
-            while count in cache:
-                self.process_result.emit(cache.pop(count))
-                count += 1
-                tbar.update()
 
         self.ip.join()
         self.process_result.emit(None)
@@ -1,5 +1,5 @@
 from numpy import ndarray
-from PySide2 import QtCore, QtWidgets
+from PySide2 import QtCore, QtGui, QtWidgets
 
 from .imageviewer import ImageViewer
 
@@ -42,5 +42,12 @@ class SliderViewer(QtWidgets.QWidget):
             image, int(self.width() * 0.95), int(self.height() * 0.95)
         )
 
+    @property
+    def canvas_size(self):
+        return int(self.width() * 0.95), int(self.height() * 0.95)
+
+    def show_qimage(self, qimg: QtGui.QImage):
+        self.canvas.render_qimage(qimg, *self.canvas_size)
+
     def setDisabled(self, disable: bool) -> None:
         self.slider.setDisabled(disable)
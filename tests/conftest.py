@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+def make_frames(folder, frames: int = 8, width: int = 160, height: int = 120):
+    """frames with bright squares that move, so every pair has some area"""
+    rng = np.random.default_rng(0)
+    background = rng.integers(90, 120, (height, width, 3), dtype=np.uint8)
+    for i in range(frames):
+        img = background.copy()
+        for k in range(6):
+            x = (k % 3) * width // 3 + (i * 5 + k) % (width // 6)
+            y = (k // 3) * height // 2 + 10
+            img[y : y + 12, x : x + 12] = 250
+        cv2.imwrite(os.fspath(folder.joinpath(f"{i:04}.png")), img)
+    return folder
+
+
+@pytest.fixture(autouse=True)
+def result_cache(tmp_path, monkeypatch):
+    # keep the runs of the tests out of the user's cache
+    monkeypatch.setenv("IMAGESUBTRACTOR_CACHE", str(tmp_path.joinpath("cache")))
+
+
+@pytest.fixture
+def frames(tmp_path):
+    folder = tmp_path.joinpath("frames")
+    folder.mkdir()
+    return make_frames(folder)
+
+
+@pytest.fixture
+def roicol():
+    from imagesubtractor.process import RoiCollection
+
+    return RoiCollection().set_rois(3, 2, 50, 55, 5, 5, 45, 50, 0)
@@ -0,0 +1,61 @@
+from conftest import make_frames
+
+from imagesubtractor import batch
+from imagesubtractor.process.batchscheduler import PRIORITIES
+from imagesubtractor.utils import dump_json
+
+
+def test_pool_backend_skips_bad_folder(tmp_path, roicol):
+    good, bad = tmp_path.joinpath("good"), tmp_path.joinpath("bad")
+    for folder in (good, bad):
+        folder.mkdir()
+        make_frames(folder, 6)
+    dump_json(good.joinpath("Roi.json"), roicol.roidict)
+    bad.joinpath("Roi.json").write_text("{not json")
+
+    ret = batch.main([str(bad), str(good), "--backend", "pool", "--workers", "2"])
+    assert ret == 1
+    assert good.joinpath("Area.csv").exists()
+    assert not bad.joinpath("Area.csv").exists()
+
+
+def test_deadline_priority_and_computed_pairs(tmp_path, roicol):
+    folders = [tmp_path.joinpath(name) for name in ("a", "b")]
+    for folder in folders:
+        folder.mkdir()
+        make_frames(folder, 6)
+        dump_json(folder.joinpath("Roi.json"), roicol.roidict)
+    argv = [*map(str, folders), "--workers", "2", "--priority", "deadline"]
+    args = batch.build_parser().parse_args([*argv, "--deadline", "9", "1"])
+    jobs = [batch.prepare_job(args, f, d) for f, d in zip(folders, args.deadline)]
+    order = sorted(jobs, key=PRIORITIES["deadline"])
+    assert [job.folder for job in order] == folders[::-1]
+    for job in jobs:
+        job.cached.close()
+
+    assert batch.run_scheduled(args, []) == 10
+    for folder in folders:
+        folder.joinpath("Area.csv").unlink()
+    # every pair comes from the cache
+    assert batch.run_scheduled(args, []) == 0
+
+
+def test_sidecars_are_not_taken_for_rois(frames, roicol):
+    dump_json(frames.joinpath("48well.json"), roicol.roidict)
+    args = [str(frames), "--backend", "thread", "--workers", "2", "--format", "npy"]
+    args.append("--no-cache")
+    assert batch.main(args) == 0
+    assert batch.find_roi_json(frames) == frames.joinpath("48well.json")
+    # the second run reads its rois from the same file again
+    assert batch.main(args) == 0
+
+
+def test_rerun_from_cache_succeeds(frames, roicol):
+    dump_json(frames.joinpath("Roi.json"), roicol.roidict)
+    args = [str(frames), "--backend", "thread", "--workers", "2"]
+    assert batch.main(args) == 0
+    area = frames.joinpath("Area.csv").read_text()
+    frames.joinpath("Area.csv").unlink()
+    # every pair comes from the cache, nothing is computed
+    assert batch.main(args) == 0
+    assert frames.joinpath("Area.csv").read_text() == area
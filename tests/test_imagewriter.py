@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from imagesubtractor.process.imagewriter import ImageWriter, SaveOptions
+
+
+def test_failed_write_does_not_stop_writer(tmp_path):
+    blocked = tmp_path.joinpath("blocked")
+    blocked.write_text("not a folder")
+    writer = ImageWriter(SaveOptions(fmt="png", queue_size=2))
+    writer.start()
+    img = np.zeros((8, 8), dtype=np.uint8)
+    for num in range(4):
+        writer.put(blocked, num, img)
+    writer.put(tmp_path.joinpath("out"), 4, img)
+    writer.close()
+    assert writer.failed == 4
+    assert writer.count == 1
+    assert tmp_path.joinpath("out", SaveOptions(fmt="png").filename(4)).exists()
+
+
+def test_put_raises_when_writer_stopped(tmp_path):
+    writer = ImageWriter(SaveOptions(queue_size=1))
+    writer.start()
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.put(tmp_path, 0, np.zeros((8, 8), dtype=np.uint8))
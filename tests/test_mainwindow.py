@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+QtWidgets = pytest.importorskip("PySide2.QtWidgets")
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def wait_loaded(app, window, timeout: float = 10.0):
+    t1 = time.monotonic()
+    while window.loader is not None and time.monotonic() - t1 < timeout:
+        app.processEvents()
+    assert window.loader is None
+
+
+def test_open_folder(app, frames):
+    from imagesubtractor.mainwindow import MainWindow
+
+    window = MainWindow()
+    try:
+        window.setup_imagestack(frames)
+        wait_loaded(app, window)
+        assert len(window.ims) == 8
+        assert window.roicol is not None and len(window.roicol)
+        assert window.endslice == 7
+        assert window.slicestep == 1
+    finally:
+        window.close()
+
+
+def test_spinbox_keeps_timer_interval(app):
+    from imagesubtractor.mainwindow import MainWindow
+
+    window = MainWindow()
+    try:
+        window.spinBox_step.setValue(3)
+        window.spinBox_columns.setValue(5)
+        assert window.render_timer.interval() == 150
+        assert window.roi_timer.interval() == 40
+    finally:
+        window.close()
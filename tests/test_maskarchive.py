@@ -0,0 +1,23 @@
+import numpy as np
+
+from imagesubtractor.process import Imagestack, MaskArchive, Subtractor
+from imagesubtractor.process.maskarchive import MaskArchiveWriter
+
+
+def test_remeasure_matches_measureareas(frames, roicol, tmp_path):
+    ims = Imagestack().set_folder(frames)
+    subtractor = Subtractor(2)
+    writer = MaskArchiveWriter(tmp_path)
+    expected = []
+    for num in range(len(ims) - 1):
+        _, _, binary = subtractor.compute(ims.read_image(num), ims.read_image(num + 1))
+        writer.append(num, binary)
+        expected.append(roicol.measureareas(binary))
+    writer.close()
+
+    archive = MaskArchive(tmp_path)
+    assert len(archive) == len(ims) - 1
+    nums, areas = archive.remeasure(roicol, batch=3)
+    assert nums.tolist() == list(range(len(ims) - 1))
+    np.testing.assert_array_equal(areas, np.array(expected))
+    assert areas.any()
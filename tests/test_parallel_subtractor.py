@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from imagesubtractor import batch
+from imagesubtractor.process import (
+    Imagestack,
+    PoolSubtractor,
+    ThreadSubtractor,
+    WorkerError,
+)
+from imagesubtractor.process.areawriter import checkpoint_path
+from imagesubtractor.utils import dump_json
+
+
+@pytest.fixture
+def broken(frames):
+    # cv2.imread returns None for this frame, its two pairs fail
+    frames.joinpath("0003.png").write_bytes(b"not an image")
+    return frames
+
+
+@pytest.mark.parametrize("backend", [PoolSubtractor, ThreadSubtractor])
+def test_retrieve_raises_after_failed_task(broken, roicol, backend):
+    ims = Imagestack().set_folder(broken)
+    processnum, tasks = ims.create_list_tasks(0, len(ims) - 1, 1)
+    subtractors = backend(2).setup_pool(processnum, tasks, roicol, 2, False)
+    subtractors.start()
+    with pytest.raises(WorkerError):
+        while subtractors.retrieve().num is not None:
+            pass
+    subtractors.join()
+
+
+def test_batch_run_with_failed_task_is_unfinished(broken, roicol):
+    dump_json(broken.joinpath("Roi.json"), roicol.roidict)
+    assert batch.main([str(broken), "--backend", "thread", "--workers", "2"]) == 1
+    with open(checkpoint_path(broken.joinpath("Area.csv"))) as f:
+        assert not json.load(f)["complete"]
+
+
+def test_thread_backend_flushes_saved_frames(frames, roicol, tmp_path):
+    from imagesubtractor.process import FrameStore, SaveOptions
+
+    ims = Imagestack().set_folder(frames)
+    processnum, tasks = ims.create_list_tasks(0, len(ims) - 1, 1)
+    options = SaveOptions(fmt="stack", outputdir=str(tmp_path.joinpath("out")))
+    subtractors = ThreadSubtractor(2).setup_pool(
+        processnum, tasks, roicol, 2, False, saveflag=options
+    )
+    subtractors.start()
+    while subtractors.retrieve().num is not None:
+        pass
+    # on disk when the end marker arrives, not at interpreter exit
+    assert len(FrameStore(tmp_path.joinpath("out"), options.stack)) == processnum
@@ -0,0 +1,27 @@
+import pickle
+import threading
+
+from imagesubtractor.process import PreviewPolicy
+
+
+def test_every_sec_is_kept_per_policy_and_thread():
+    policy, other = PreviewPolicy(0, 60.0), PreviewPolicy(0, 60.0)
+    assert policy.want(0)
+    assert not policy.want(1)
+    # another run has its own clock
+    assert other.want(0)
+
+    sent = []
+    thread = threading.Thread(target=lambda: sent.append(policy.want(2)))
+    thread.start()
+    thread.join()
+    assert sent == [True]
+
+
+def test_every_sec_survives_pickling_per_task():
+    policy = PreviewPolicy(0, 60.0)
+    first, second = (pickle.loads(pickle.dumps(policy)) for _ in range(2))
+    assert first.want(0)
+    # the copy of the next task shares the clock of the first one
+    assert not second.want(1)
+    assert policy.want(2)
@@ -0,0 +1,25 @@
+import json
+
+import numpy as np
+
+from imagesubtractor.process import ShardCoordinator, ShardNode
+
+
+def test_node_keeps_the_lock_of_another_node(tmp_path, frames, roicol):
+    shard_dir = tmp_path.joinpath("shards")
+    coordinator = ShardCoordinator(shard_dir)
+    (shard,) = coordinator.plan(frames, roicol, 2.0, False, 0, 7, 1, 1)
+    lock = coordinator.path(shard, ".lock")
+    node, other = ShardNode(shard_dir, node_id="a"), ShardNode(shard_dir, node_id="b")
+
+    def process(shard):
+        # re-queued while this node stalls, then claimed by another node
+        assert node.owns(lock)
+        lock.unlink()
+        assert other.claim() == shard
+        return np.zeros((shard.npairs, len(roicol)), dtype="u4")
+
+    node.process = process
+    assert node.run(poll=0.01) == 1
+    assert not node.owns(lock) and other.owns(lock)
+    assert json.loads(lock.read_text())["node"] == "b"
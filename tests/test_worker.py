@@ -0,0 +1,16 @@
+import os
+
+from imagesubtractor.process import Imagestack, SaveOptions, Subtractor
+from imagesubtractor.process.imagewriter import image_writer
+from imagesubtractor.process.queue_item import Task
+from imagesubtractor.process.worker import subtract_worker_func
+
+
+def test_worker_saves_with_options(frames, roicol, tmp_path):
+    ims = Imagestack().set_folder(frames)
+    options = SaveOptions(fmt="png", outputdir=os.fspath(tmp_path.joinpath("out")))
+    task = Task(0, os.fspath(ims.imagelist[0]), os.fspath(ims.imagelist[1]))
+    res = subtract_worker_func(task, roicol, Subtractor(2), saveflag=options)
+    image_writer(options).close()
+    assert res.data.shape == (len(roicol),)
+    assert tmp_path.joinpath("out", options.filename(0)).exists()